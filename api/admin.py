@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from api.models import RewardLog, ScheduledReward, User
+from api.models import RewardLog, ScheduledReward, ScheduledRewardArchive, User
 
 
 @admin.register(User)
@@ -10,6 +10,8 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ("is_staff", "is_superuser", "is_active")
     search_fields = ("username", "first_name", "last_name", "email")
     ordering = ("username",)
+    # Coins only change through reward logs, so the balance matches their sum
+    readonly_fields = ("coins",)
     fieldsets = (
         (None, {"fields": ("username", "password")}),
         ("Personal info", {"fields": ("first_name", "last_name", "email", "coins")}),
@@ -21,7 +23,7 @@ class CustomUserAdmin(UserAdmin):
             None,
             {
                 "classes": ("wide",),
-                "fields": ("username", "email", "password1", "password2", "coins"),
+                "fields": ("username", "email", "password1", "password2"),
             },
         ),
     )
@@ -42,3 +44,20 @@ class RewardLogAdmin(admin.ModelAdmin):
     search_fields = ("user__username", "reason")
     date_hierarchy = "given_at"
     readonly_fields = ("given_at",)
+
+    # Reward logs are the ledger the coins of users are reconciled with, only
+    # the processors write them
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ScheduledRewardArchive)
+class ScheduledRewardArchiveAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "amount", "execute_at")
+    search_fields = ("user__username",)
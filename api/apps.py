@@ -1,5 +1,8 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.utils import timezone
 
 
@@ -9,22 +12,105 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         post_migrate.connect(self.update_periodic_tasks, sender=self)
+        connection_created.connect(self.time_queries)
+        user_model = self.get_model("User")
+        post_save.connect(self.invalidate_user_cache, sender=user_model)
+        post_delete.connect(self.invalidate_user_cache, sender=user_model)
+        reward_model = self.get_model("ScheduledReward")
+        post_save.connect(self.invalidate_owner_cache, sender=reward_model)
+        post_delete.connect(self.invalidate_owner_cache, sender=reward_model)
+        post_save.connect(self.note_next_due, sender=reward_model)
+        post_save.connect(self.index_reward, sender=reward_model)
+        post_delete.connect(self.unindex_reward, sender=reward_model)
+
+    @staticmethod
+    def time_queries(sender, connection, **kwargs):
+        # Every thread has its own connections, the wrapper times the queries
+        # of the request on whichever thread runs them
+        from api.middleware import time_query
+
+        if time_query not in connection.execute_wrappers:
+            # First, so that execute_wrapper() blocks still pop their own
+            connection.execute_wrappers.insert(0, time_query)
+
+    @staticmethod
+    def invalidate_user_cache(sender, instance, **kwargs):
+        # Cached responses and authenticated users of the user are outdated
+        # once the change is visible, a request reading the row before the
+        # commit must not cache it under the new version
+        from api import user_cache
+
+        user_id = instance.pk
+        transaction.on_commit(lambda: user_cache.bump_versions([user_id]))
+
+    @staticmethod
+    def invalidate_owner_cache(sender, instance, **kwargs):
+        # Rewards changed outside of the API, e.g. in the admin, change the
+        # rewards list and its ETag as well
+        from api import user_cache
+
+        user_id = instance.user_id
+        transaction.on_commit(lambda: user_cache.bump_versions([user_id]))
+
+    @staticmethod
+    def note_next_due(sender, instance, **kwargs):
+        # Wake the rewards sweep up in time for the new reward
+        from api import next_due
+
+        if settings.REWARDS_NEXT_DUE_HINT and not instance.is_executed:
+            transaction.on_commit(lambda: next_due.note(instance.execute_at))
+
+    @staticmethod
+    def index_reward(sender, instance, **kwargs):
+        # Rewards saved outside of the API, e.g. in the admin, are indexed as
+        # well, a changed execution time updates the score
+        from api import due_index
+
+        if not settings.REWARDS_DUE_INDEX:
+            return
+        if instance.is_executed:
+            transaction.on_commit(lambda: due_index.remove([instance.pk]))
+        else:
+            transaction.on_commit(lambda: due_index.add([instance]))
+
+    @staticmethod
+    def unindex_reward(sender, instance, **kwargs):
+        from api import due_index
+
+        # The primary key of the instance is cleared after the delete
+        reward_id = instance.pk
+        if settings.REWARDS_DUE_INDEX:
+            transaction.on_commit(lambda: due_index.remove([reward_id]))
 
     def update_periodic_tasks(self, *args, **kwargs):
         from django_celery_beat.models import CrontabSchedule, PeriodicTask
 
-        crontab_every_minute, _ = CrontabSchedule.objects.get_or_create(
-            minute="*",
+        sweep_crontab, _ = CrontabSchedule.objects.get_or_create(
+            minute=settings.REWARDS_SWEEP_MINUTE,
             hour="*",
             day_of_week="*",
             day_of_month="*",
             month_of_year="*",
         )
-        task, created = PeriodicTask.objects.get_or_create(
+        task, created = PeriodicTask.objects.update_or_create(
             name="process_rewards",
-            task="api.tasks.process_rewards",
-            crontab=crontab_every_minute,
+            defaults={"task": "api.tasks.process_rewards", "crontab": sweep_crontab},
         )
         if created:
             task.start_time = timezone.now()
             task.save()
+
+        maintenance_crontab, _ = CrontabSchedule.objects.get_or_create(
+            minute="30",
+            hour="3",
+            day_of_week="*",
+            day_of_month="*",
+            month_of_year="*",
+        )
+        PeriodicTask.objects.update_or_create(
+            name="rotate_reward_tables",
+            defaults={
+                "task": "api.tasks.rotate_reward_tables",
+                "crontab": maintenance_crontab,
+            },
+        )
@@ -0,0 +1,70 @@
+"""
+Async versions of the hot API views, served when the API runs under ASGI.
+
+Blocking parts without an async ORM counterpart, the cursor pagination and the
+award transaction, run in the thread pool of asgiref.
+"""
+
+from adrf import viewsets
+from asgiref.sync import sync_to_async
+
+from django.utils.cache import get_conditional_response
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from api import idempotency, user_cache
+from api.throttling import AwardRequestThrottle
+from api.views import ProfileViewMixin, RewardsViewMixin
+
+
+class AsyncProfileViewSet(ProfileViewMixin, viewsets.GenericViewSet):
+    """Profile of the authenticated user"""
+
+    async def list(self, request, *args, **kwargs):
+        async def build():
+            return self.get_profile()
+
+        data = await user_cache.aget_payload(request.user.id, "profile", build)
+        return Response(data)
+
+
+class AsyncRewardsViewSet(RewardsViewMixin, viewsets.GenericViewSet):
+    """Scheduled rewards of the authenticated user"""
+
+    async def list(self, request, *args, **kwargs):
+        version = await user_cache.aget_version(request.user.id)
+        page_key, etag, last_modified = self.get_validators(request, version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(
+                await user_cache.aget_payload(
+                    request.user.id,
+                    f"rewards:{page_key}",
+                    sync_to_async(self.get_page),
+                    version,
+                )
+            )
+        return self.set_validators(response, etag, last_modified)
+
+    @extend_schema(parameters=[idempotency.SCHEMA_PARAMETER])
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="request",
+        throttle_classes=[AwardRequestThrottle],
+    )
+    async def award_request(self, request, *args, **kwargs):
+        return await idempotency.arun(self, request, self.arequest_award)
+
+    async def arequest_award(self, request):
+        serializer = self.get_serializer(
+            data=request.data, context={"user": request.user}
+        )
+        serializer.is_valid(raise_exception=True)
+        award = await serializer.acreate_award(serializer.validated_data)
+        serializer = self.get_serializer(award)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,79 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+from api import replicas, user_cache
+
+AUTH_USER_KEY = "user:{user_id}:auth:{version}"
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication resolving the user from the cache instead of the database.
+
+    Users are cached under the cache version of the user, which is bumped on
+    every save of the user, so deactivated or changed users are never served
+    from the cache. The password hash is never cached.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        version = user_cache.get_version(user_id)
+        replicas.pin_if_recent(version)
+        key = AUTH_USER_KEY.format(user_id=user_id, version=version)
+        cached = cache.get(key)
+        if cached is None:
+            user = super().get_user(validated_token)
+            cache.set(
+                key, self.to_cache(user), timeout=settings.AUTH_USER_CACHE_TIMEOUT
+            )
+            return user
+
+        # Only active users are cached, but the token may be revoked
+        if (
+            api_settings.CHECK_REVOKE_TOKEN
+            and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+            != cached["password_md5"]
+        ):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return self.from_cache(cached)
+
+    def cached_fields(self) -> list[str]:
+        return [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.name != "password"
+        ]
+
+    def to_cache(self, user) -> dict:
+        """Fields of the user without the password hash"""
+        password_md5 = None
+        if api_settings.CHECK_REVOKE_TOKEN:
+            password_md5 = get_md5_hash_password(user.password)
+        return {
+            "fields": {name: getattr(user, name) for name in self.cached_fields()},
+            "password_md5": password_md5,
+        }
+
+    def from_cache(self, cached: dict):
+        """User with a deferred password, loaded from the database if accessed"""
+        fields = cached["fields"]
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model), list(fields), list(fields.values())
+        )
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = CachedJWTAuthentication
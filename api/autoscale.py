@@ -0,0 +1,82 @@
+"""
+Celery autoscaler sized by the reward backlog.
+
+Celery's default autoscaler only counts the requests a worker has already
+reserved, which with a prefetch multiplier of 1 lags behind a growing queue.
+BacklogAutoscaler also counts reward tasks waiting in the broker queue and
+the due rewards chunks that REWARDS_PARTITIONS tasks process in parallel, and
+re-measures them every REWARDS_AUTOSCALE_INTERVAL seconds. It is used by
+workers started with --autoscale=MAX,MIN.
+"""
+
+import logging
+import math
+from time import monotonic
+
+from celery import current_app
+from celery.worker.autoscale import Autoscaler
+from kombu.exceptions import OperationalError
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+
+from api.models import ScheduledReward
+
+logger = logging.getLogger(__name__)
+
+
+def queue_depth(app, queue: str) -> int:
+    """Messages waiting in a broker queue"""
+    with app.connection_for_read() as connection:
+        try:
+            return connection.default_channel.queue_declare(
+                queue=queue, passive=True
+            ).message_count
+        except connection.channel_errors:
+            # Redis drops the list of an empty queue
+            return 0
+
+
+def due_count() -> int:
+    """Due rewards, counted on a connection owned by the autoscaler thread"""
+    # The thread outlives the database timeouts between measurements
+    close_old_connections()
+    try:
+        return ScheduledReward.objects.due().count()
+    finally:
+        connection.close()
+
+
+def measure_backlog(app) -> int:
+    """Pool processes worth running for the queued tasks and due rewards"""
+    try:
+        queued = queue_depth(app, settings.REWARDS_QUEUE)
+        due = due_count()
+    except (OperationalError, DatabaseError):
+        logger.exception("Measuring the rewards backlog failed")
+        return 0
+    # Due rewards are executed by at most one task per partition at a time
+    chunks = math.ceil(due / settings.REWARDS_CHUNK_SIZE)
+    return queued + min(chunks, settings.REWARDS_PARTITIONS)
+
+
+class BacklogAutoscaler(Autoscaler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._backlog = 0
+        self._measured_at = None
+
+    @property
+    def qty(self):
+        return max(super().qty, self.backlog())
+
+    def backlog(self) -> int:
+        now = monotonic()
+        if (
+            self._measured_at is None
+            or now - self._measured_at >= settings.REWARDS_AUTOSCALE_INTERVAL
+        ):
+            app = self.worker.app if self.worker else current_app
+            self._backlog = measure_backlog(app)
+            self._measured_at = now
+        return self._backlog
@@ -0,0 +1,45 @@
+"""
+Celery beat scheduler that times the rewards sweep by the next-due hint.
+"""
+
+import math
+import time
+
+from celery.schedules import schedstate
+from celery.utils.time import maybe_make_aware
+
+from django_celery_beat.schedulers import DatabaseScheduler, ModelEntry
+
+from api import next_due
+
+PROCESS_REWARDS_TASK = "api.tasks.process_rewards"
+
+
+class RewardsEntry(ModelEntry):
+    def is_due(self):
+        state = super().is_due()
+        if self.task != PROCESS_REWARDS_TASK or not self.model.enabled:
+            return state
+
+        next_due_at = next_due.get()
+        if next_due_at is None:
+            # Unknown hint, keep the crontab cadence
+            return state
+
+        if next_due_at == math.inf:
+            # Nothing pending, look at the hint again at the next crontab time
+            return schedstate(False, state.next)
+        now = time.time()
+        if next_due_at > now:
+            # Sleep until the next reward is due instead of sweeping in vain
+            return schedstate(False, next_due_at - now)
+        if maybe_make_aware(self.last_run_at).timestamp() < next_due_at:
+            # Rewards became due since the last sweep, run without waiting
+            return schedstate(True, state.next)
+        return state
+
+
+class RewardsScheduler(DatabaseScheduler):
+    """Skips the rewards sweep while no pending reward is due"""
+
+    Entry = RewardsEntry
@@ -0,0 +1,158 @@
+"""
+Helpers for performance benchmarks of the rewards processing and the API.
+
+Data is seeded with bulk inserts only, so millions of rows can be generated in
+minutes on MariaDB and on SQLite alike.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from datetime import timedelta
+from typing import Callable
+
+import httpx
+
+from django.db.models import F
+from django.utils import timezone
+
+from api.models import RewardLog, ScheduledReward, User
+
+BENCH_USER_PREFIX = "bench_user"
+
+
+def seed_rewards(
+    users: int,
+    rewards: int,
+    due_ratio: float = 0.1,
+    executed_ratio: float = 0.5,
+    spread_days: int = 30,
+    batch_size: int = 10_000,
+    seed: int | None = None,
+) -> None:
+    """
+    Create `users` users and `rewards` scheduled rewards spread over them.
+
+    `executed_ratio` of the rewards are already executed in the past,
+    `due_ratio` are pending and due now, the rest are pending in the future.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    spread = timedelta(days=spread_days).total_seconds()
+
+    first_id = (
+        User.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    ) + 1
+    User.objects.bulk_create(
+        (
+            User(username=f"{BENCH_USER_PREFIX}_{first_id + i}", password="!")
+            for i in range(users)
+        ),
+        batch_size=batch_size,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith=BENCH_USER_PREFIX).values_list(
+            "pk", flat=True
+        )
+    )
+
+    def make_reward():
+        kind = rng.random()
+        if kind < executed_ratio:
+            execute_at, is_executed = (
+                now - timedelta(seconds=rng.uniform(0, spread)),
+                True,
+            )
+        elif kind < executed_ratio + due_ratio:
+            execute_at, is_executed = (
+                now - timedelta(seconds=rng.uniform(0, 3600)),
+                False,
+            )
+        else:
+            execute_at, is_executed = (
+                now + timedelta(seconds=rng.uniform(0, spread)),
+                False,
+            )
+        return ScheduledReward(
+            user_id=rng.choice(user_ids),
+            amount=rng.randint(1, 100),
+            execute_at=execute_at,
+            is_executed=is_executed,
+        )
+
+    first_reward_id = (
+        ScheduledReward.objects.order_by("-pk").values_list("pk", flat=True).first()
+        or 0
+    )
+    ScheduledReward.objects.bulk_create(
+        (make_reward() for _ in range(rewards)), batch_size=batch_size
+    )
+    # created_at is set by auto_now_add, align it with the 5 minutes delay of
+    # award requests in a single statement
+    ScheduledReward.objects.filter(pk__gt=first_reward_id).update(
+        created_at=F("execute_at") - timedelta(minutes=5)
+    )
+
+
+def delete_seeded_data() -> None:
+    """Delete the seeded users with their rewards and reward logs"""
+    users = User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+    RewardLog.objects.filter(user__in=users).delete()
+    ScheduledReward.objects.filter(user__in=users).delete()
+    users.delete()
+
+
+def measure(func: Callable, repeat: int) -> dict:
+    """Run `func` `repeat` times, return timings in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+async def run_load(
+    url: str,
+    requests: int,
+    concurrency: int,
+    headers: dict | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> dict:
+    """GET `url` `requests` times from `concurrency` clients, return throughput and latencies"""
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, transport=transport) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(quantiles[49], 3),
+        "p95_ms": round(quantiles[94], 3),
+        "p99_ms": round(quantiles[98], 3),
+        "max_ms": round(max(latencies), 3),
+    }
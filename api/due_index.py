@@ -0,0 +1,53 @@
+"""
+Redis sorted-set index of pending scheduled rewards.
+
+Ids of pending rewards are scored by the timestamp of their execution time, so
+the processor finds due rewards with ZRANGEBYSCORE and fetches them by primary
+key instead of scanning the rewards table.
+"""
+
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from api.redis_client import get_redis
+
+INDEX_KEY = "rewards:due"
+
+# Take due ids off the index atomically, so concurrent processors never pop
+# the same reward
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+for i = 1, #due, 2 do
+    redis.call('ZREM', KEYS[1], due[i])
+end
+return due
+"""
+
+
+def add(rewards: Iterable) -> None:
+    scores = {reward.id: reward.execute_at.timestamp() for reward in rewards}
+    if scores:
+        get_redis().zadd(INDEX_KEY, scores)
+
+
+def restore(scores: dict[int, float]) -> None:
+    """Put popped ids back, e.g. when their processing failed"""
+    if scores:
+        get_redis().zadd(INDEX_KEY, scores)
+
+
+def remove(reward_ids: Iterable[int]) -> None:
+    reward_ids = list(reward_ids)
+    if reward_ids:
+        get_redis().zrem(INDEX_KEY, *reward_ids)
+
+
+def pop_due(now: datetime, limit: int) -> dict[int, float]:
+    """Remove up to `limit` ids due at `now` from the index and return their scores"""
+    due = get_redis().eval(POP_DUE_SCRIPT, 1, INDEX_KEY, now.timestamp(), limit)
+    return {int(due[i]): float(due[i + 1]) for i in range(0, len(due), 2)}
+
+
+def iter_ids() -> Iterator[int]:
+    for reward_id, _ in get_redis().zscan_iter(INDEX_KEY):
+        yield int(reward_id)
@@ -0,0 +1,75 @@
+"""
+Streaming exports of reward logs.
+
+Rows are read as tuples in (given_at, id) keyset chunks, so memory stays
+constant however many rows are exported. mysqlclient buffers whole result
+sets on the client, a single iterator() over the table would not.
+"""
+
+import csv
+import json
+from datetime import datetime
+from typing import Iterator
+
+from django.db.models import Q
+
+EXPORT_FIELDS = ("id", "user_id", "user__username", "amount", "given_at", "reason")
+EXPORT_COLUMNS = ("id", "user_id", "username", "amount", "given_at", "reason")
+EXPORT_CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def filter_reward_logs(
+    queryset, start: datetime | None = None, end: datetime | None = None
+):
+    if start:
+        queryset = queryset.filter(given_at__gte=start)
+    if end:
+        queryset = queryset.filter(given_at__lt=end)
+    return queryset
+
+
+def iter_rows(queryset, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    rows = queryset.order_by("given_at", "id").values_list(*EXPORT_FIELDS)
+    chunk = list(rows[:chunk_size])
+    while chunk:
+        yield from chunk
+        last_id, last_given_at = chunk[-1][0], chunk[-1][4]
+        chunk = list(
+            rows.filter(
+                Q(given_at__gt=last_given_at)
+                | Q(given_at=last_given_at, id__gt=last_id)
+            )[:chunk_size]
+        )
+
+
+class Echo:
+    """File-like object returning written lines, for csv.writer"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv(rows: Iterator[tuple]) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(_serialize(row))
+
+
+def iter_ndjson(rows: Iterator[tuple]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, _serialize(row)))) + "\n"
+
+
+def export(queryset, export_format: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    rows = iter_rows(queryset, chunk_size)
+    return iter_csv(rows) if export_format == "csv" else iter_ndjson(rows)
+
+
+def _serialize(row: tuple) -> tuple:
+    reward_id, user_id, username, amount, given_at, reason = row
+    return reward_id, user_id, username, amount, given_at.isoformat(), reason
@@ -0,0 +1,107 @@
+"""
+Fast read path of model serializers for list responses.
+
+`RowSerializer` builds the representation of a DRF serializer from `.values()`
+rows, without model instances and without walking the field objects per row.
+Fields are inspected once per serializer class: values the database already
+returns in their JSON form are passed through, ISO 8601 datetimes are formatted
+with the current timezone resolved once per call, and the other values are
+converted by the `to_representation` of the field, so the output is the one of
+the serializer.
+"""
+
+from functools import cache
+from operator import attrgetter
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Fields whose representation of a database value is the value itself
+PASS_THROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.IntegerField,
+)
+
+
+def is_iso_datetime(field: serializers.Field) -> bool:
+    return (
+        type(field) is serializers.DateTimeField
+        and not hasattr(field, "timezone")
+        and str(getattr(field, "format", api_settings.DATETIME_FORMAT)).lower()
+        == ISO_8601
+    )
+
+
+def iso_datetime_converter(field: serializers.DateTimeField, tz) -> Callable:
+    """`DateTimeField.to_representation` of aware datetimes in timezone `tz`"""
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return convert
+
+
+class RowSerializer:
+    def __init__(self, serializer_class: type[serializers.Serializer]):
+        self.fields: list[tuple[str, str, serializers.Field]] = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if field.source == "*" or isinstance(
+                field, (serializers.SerializerMethodField, serializers.BaseSerializer)
+            ):
+                raise TypeError(
+                    f"{serializer_class.__name__}.{name} can not be read from a row"
+                )
+            self.fields.append((name, field.source.replace(".", "__"), field))
+        self.sources = tuple(source for _, source, _ in self.fields)
+        self.getters = [
+            (source, attrgetter(source.replace("__", "."))) for source in self.sources
+        ]
+
+    def get_converters(self) -> list[tuple[str, str, Callable | None]]:
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        converters = []
+        for name, source, field in self.fields:
+            if type(field) in PASS_THROUGH_FIELDS:
+                convert = None
+            elif tz is not None and is_iso_datetime(field):
+                convert = iso_datetime_converter(field, tz)
+            else:
+                convert = field.to_representation
+            converters.append((name, source, convert))
+        return converters
+
+    def to_representation_many(self, rows: Iterable[dict]) -> list[dict]:
+        converters = self.get_converters()
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, convert in converters:
+                value = row[source]
+                item[name] = (
+                    value if convert is None or value is None else convert(value)
+                )
+            data.append(item)
+        return data
+
+    def to_representation(self, row: dict) -> dict:
+        return self.to_representation_many([row])[0]
+
+    def from_instance(self, instance) -> dict:
+        return self.to_representation(
+            {source: getter(instance) for source, getter in self.getters}
+        )
+
+
+@cache
+def get_row_serializer(serializer_class) -> RowSerializer:
+    return RowSerializer(serializer_class)
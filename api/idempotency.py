@@ -0,0 +1,149 @@
+"""
+Idempotency keys of POST requests.
+
+The first response to a request with an `Idempotency-Key` header is stored in
+the cache for IDEMPOTENCY_KEY_TTL seconds, retries with the same key replay it
+without running the view. Requests with the same key are serialized through a
+short cache lock, a duplicate arriving while the first one runs waits for its
+response.
+"""
+
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+RESPONSE_KEY = "idempotency:{user_id}:{key}"
+LOCK_KEY = "idempotency:{user_id}:{key}:lock"
+POLL_INTERVAL = 0.05
+
+SCHEMA_PARAMETER = OpenApiParameter(
+    HEADER,
+    OpenApiTypes.STR,
+    OpenApiParameter.HEADER,
+    description="Retries with the same key replay the first response",
+)
+
+
+class IdempotentRequest:
+    def __init__(self, request):
+        key = hashlib.sha256(request.headers[HEADER].encode()).hexdigest()
+        self.response_key = RESPONSE_KEY.format(user_id=request.user.pk, key=key)
+        self.lock_key = LOCK_KEY.format(user_id=request.user.pk, key=key)
+        # Read before the view parses the body
+        self.fingerprint = hashlib.sha256(request.body).hexdigest()
+
+    def replay(self, stored: dict) -> Response:
+        if stored["fingerprint"] != self.fingerprint:
+            return Response(
+                {"detail": f"{HEADER} was already used for a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(
+            stored["data"], status=stored["status"], headers={REPLAYED_HEADER: "true"}
+        )
+
+    def to_store(self, response: Response) -> dict | None:
+        # Server errors are transient, retries run the view again
+        if response.status_code >= 500:
+            return None
+        return {
+            "fingerprint": self.fingerprint,
+            "status": response.status_code,
+            "data": response.data,
+        }
+
+    def store(self, response: Response) -> None:
+        if (stored := self.to_store(response)) is not None:
+            cache.set(self.response_key, stored, timeout=settings.IDEMPOTENCY_KEY_TTL)
+
+    async def astore(self, response: Response) -> None:
+        if (stored := self.to_store(response)) is not None:
+            await cache.aset(
+                self.response_key, stored, timeout=settings.IDEMPOTENCY_KEY_TTL
+            )
+
+    def wait(self) -> Response:
+        """Replay the response of the request holding the lock once it is stored"""
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            if (stored := cache.get(self.response_key)) is not None:
+                return self.replay(stored)
+        return self.in_progress()
+
+    async def await_response(self) -> Response:
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            if (stored := await cache.aget(self.response_key)) is not None:
+                return self.replay(stored)
+        return self.in_progress()
+
+    @staticmethod
+    def in_progress() -> Response:
+        return Response(
+            {"detail": f"A request with this {HEADER} is still in progress."},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+
+def run(view, request, handler) -> Response:
+    """Run `handler(request)` of the view once per idempotency key"""
+    if HEADER not in request.headers:
+        return handler(request)
+
+    idempotent = IdempotentRequest(request)
+    if (stored := cache.get(idempotent.response_key)) is not None:
+        return idempotent.replay(stored)
+    if not cache.add(idempotent.lock_key, 1, timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+        return idempotent.wait()
+
+    try:
+        # The first request may have finished between the lookup and the lock
+        if (stored := cache.get(idempotent.response_key)) is not None:
+            return idempotent.replay(stored)
+        try:
+            response = handler(request)
+        except APIException as exc:
+            # Validation errors are responses worth replaying as well
+            response = view.handle_exception(exc)
+        idempotent.store(response)
+        return response
+    finally:
+        cache.delete(idempotent.lock_key)
+
+
+async def arun(view, request, handler) -> Response:
+    """Async `run`, `handler` is a coroutine function"""
+    if HEADER not in request.headers:
+        return await handler(request)
+
+    idempotent = IdempotentRequest(request)
+    if (stored := await cache.aget(idempotent.response_key)) is not None:
+        return idempotent.replay(stored)
+    if not await cache.aadd(
+        idempotent.lock_key, 1, timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT
+    ):
+        return await idempotent.await_response()
+
+    try:
+        if (stored := await cache.aget(idempotent.response_key)) is not None:
+            return idempotent.replay(stored)
+        try:
+            response = await handler(request)
+        except APIException as exc:
+            response = view.handle_exception(exc)
+        await idempotent.astore(response)
+        return response
+    finally:
+        await cache.adelete(idempotent.lock_key)
@@ -0,0 +1,61 @@
+"""
+Single-flight leases in Redis.
+
+A lease is a key holding a random token with a TTL. Only the holder of the
+token renews or releases it, so a run that stalled past the TTL cannot release
+the lease of its successor.
+"""
+
+import secrets
+from contextlib import contextmanager
+from typing import Iterator
+
+from api.redis_client import get_redis
+
+LEASE_KEY = "lease:{name}"
+
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class Lease:
+    def __init__(self, name: str, ttl: float):
+        self.key = LEASE_KEY.format(name=name)
+        self.ttl_ms = int(ttl * 1000)
+        self.token = secrets.token_hex(16)
+
+    def acquire(self) -> bool:
+        return bool(get_redis().set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    def heartbeat(self) -> bool:
+        """Extend the lease by its TTL, False when it expired and was lost"""
+        return bool(
+            get_redis().eval(RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms)
+        )
+
+    def release(self) -> None:
+        get_redis().eval(RELEASE_SCRIPT, 1, self.key, self.token)
+
+
+@contextmanager
+def single_flight(name: str, ttl: float) -> Iterator[Lease | None]:
+    """Hold the lease for the block, yields None when another run holds it"""
+    lease = Lease(name, ttl)
+    if not lease.acquire():
+        yield None
+        return
+    try:
+        yield lease
+    finally:
+        lease.release()
@@ -0,0 +1,55 @@
+"""
+Coin ledger invariant: the balance of a user equals the sum of their reward logs.
+"""
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from api import user_cache
+from api.models import DEFAULT_CHUNK_SIZE, User
+
+
+def ledger_balances(users):
+    """Balances and reward log totals of users, in one grouped aggregate query"""
+    return users.values("pk", "coins").annotate(
+        ledger=Coalesce(Sum("reward_logs__amount"), 0)
+    )
+
+
+def iter_drift(chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Walk all users in primary key order, chunk by chunk.
+
+    Yields the number of checked users and the balances whose coins differ from
+    the reward log total of each chunk.
+    """
+    last_pk = 0
+    while True:
+        balances = list(
+            ledger_balances(User.objects.filter(pk__gt=last_pk)).order_by("pk")[
+                :chunk_size
+            ]
+        )
+        if not balances:
+            return
+        last_pk = balances[-1]["pk"]
+        yield len(balances), [
+            balance for balance in balances if balance["coins"] != balance["ledger"]
+        ]
+
+
+def repair(user_ids) -> int:
+    """Set coins of the users to their reward log totals with one bulk UPDATE"""
+    with transaction.atomic():
+        # Reward execution updates the balance and inserts the log in one
+        # transaction, after the lock both are consistent
+        list(User.objects.select_for_update().filter(pk__in=user_ids).values("pk"))
+        users = [
+            User(pk=balance["pk"], coins=balance["ledger"])
+            for balance in ledger_balances(User.objects.filter(pk__in=user_ids))
+            if balance["coins"] != balance["ledger"]
+        ]
+        User.objects.bulk_update(users, ["coins"])
+    user_cache.bump_versions(user.pk for user in users)
+    return len(users)
@@ -0,0 +1,118 @@
+"""
+Maintenance of the growing reward tables.
+
+On MariaDB the reward log is RANGE partitioned by month of `given_at`, with
+one partition per month named pYYYYMM and a catch-all `pmax` partition. Executed
+scheduled rewards past the retention window are moved to a compact archive table.
+"""
+
+from datetime import date, datetime
+
+from django.db import connection, transaction
+
+from api import user_cache
+from api.models import RewardLog, ScheduledReward, ScheduledRewardArchive
+
+ARCHIVED_FIELDS = (
+    "id",
+    "user_id",
+    "amount",
+    "execute_at",
+    "created_at",
+    "request_date",
+)
+
+
+def month_start(day: date, months: int = 0) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def get_reward_log_partitions() -> list[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION",
+            [RewardLog._meta.db_table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rotate_reward_log_partitions(today: date, months_ahead: int) -> list[str]:
+    """
+    Split monthly partitions off `pmax` up to `months_ahead` months from today.
+
+    Returns names of created partitions, nothing is done on databases without
+    partitioning of the table.
+    """
+    if connection.vendor != "mysql":
+        return []
+    partitions = get_reward_log_partitions()
+    if "pmax" not in partitions:
+        return []
+
+    created, definitions = [], []
+    for months in range(months_ahead + 1):
+        start = month_start(today, months)
+        name = f"p{start:%Y%m}"
+        if name in partitions:
+            continue
+        created.append(name)
+        definitions.append(
+            f"PARTITION {name} VALUES LESS THAN "
+            f"(TO_DAYS('{month_start(start, 1)}'))"
+        )
+    if definitions:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {RewardLog._meta.db_table} REORGANIZE PARTITION pmax "
+                f"INTO ({', '.join(definitions)}, "
+                "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+            )
+    return created
+
+
+def delete_rewards(reward_ids: list[int]) -> None:
+    """
+    Delete rewards by primary key in a single query.
+
+    The ORM delete would select the rows again and send the delete signals for
+    each of them, nothing references rewards and executed ones are not indexed.
+    """
+    placeholders = ", ".join(["%s"] * len(reward_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {ScheduledReward._meta.db_table} "
+            f"WHERE id IN ({placeholders})",
+            reward_ids,
+        )
+
+
+def archive_executed_rewards(
+    executed_before: datetime, batch_size: int, max_batches: int | None = None
+) -> int:
+    """Move executed rewards to the archive, one bounded transaction per batch"""
+    archived, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rewards = list(
+                ScheduledReward.objects.filter(
+                    is_executed=True, execute_at__lt=executed_before
+                )
+                .order_by("execute_at", "pk")
+                .values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rewards:
+                break
+            ScheduledRewardArchive.objects.bulk_create(
+                (ScheduledRewardArchive(**reward) for reward in rewards),
+                ignore_conflicts=True,
+            )
+            delete_rewards([reward["id"] for reward in rewards])
+            # The rewards lists of the owners changed, their ETags as well
+            user_ids = {reward["user_id"] for reward in rewards}
+            transaction.on_commit(lambda: user_cache.bump_versions(user_ids))
+        archived += len(rewards)
+        batches += 1
+    return archived
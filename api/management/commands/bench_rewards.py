@@ -0,0 +1,155 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import processing
+from api.benchmarks import BENCH_USER_PREFIX, delete_seeded_data, seed_rewards
+from api.models import DEFAULT_CHUNK_SIZE, ScheduledReward, User
+
+# Metrics compared against a baseline, with True when a higher value is better
+COMPARED_METRICS = {
+    "duration_s": False,
+    "queries": False,
+    "rows_per_sec": True,
+    "peak_memory_mb": False,
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = "Benchmark processing of seeded scheduled rewards, optionally against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--rewards", type=int, default=10_000)
+        parser.add_argument(
+            "--due-ratio",
+            type=float,
+            default=1.0,
+            help="Share of seeded rewards that are due (default: 1.0)",
+        )
+        parser.add_argument(
+            "--executed-ratio",
+            type=float,
+            default=0.0,
+            help="Share of seeded rewards that are already executed (default: 0.0)",
+        )
+        parser.add_argument("--seed", type=int, help="Random seed of the data")
+        parser.add_argument(
+            "--bulk", action="store_true", help="Benchmark the bulk mode"
+        )
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--output", help="Write results to this JSON file")
+        parser.add_argument("--baseline", help="Compare results with this JSON file")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="Allowed relative regression against the baseline (default: 0.1)",
+        )
+        parser.add_argument(
+            "--keep-data",
+            action="store_true",
+            help="Do not delete the seeded data after the run",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Seeding {options['users']} users and {options['rewards']} rewards..."
+        )
+        seed_rewards(
+            options["users"],
+            options["rewards"],
+            due_ratio=options["due_ratio"],
+            executed_ratio=options["executed_ratio"],
+            seed=options["seed"],
+        )
+        try:
+            results = self.run(options)
+        finally:
+            if not options["keep_data"]:
+                delete_seeded_data()
+
+        for name, value in results.items():
+            if name != "config":
+                self.stdout.write(f"{name:<16} {value}")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options["baseline"]:
+            self.compare(results, options["baseline"], options["threshold"])
+
+    @staticmethod
+    def run(options) -> dict:
+        # Only seeded rewards are executed, due rewards of real users are left
+        # to the processor
+        pending_rewards = ScheduledReward.objects.filter(
+            user__in=User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+        ).due()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            tracemalloc.start()
+            started = time.perf_counter()
+            if options["bulk"]:
+                processed = processing.execute_bulk(
+                    pending_rewards, options["chunk_size"]
+                )
+            else:
+                processed = processing.execute_each(pending_rewards)
+            duration = time.perf_counter() - started
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        return {
+            "config": {
+                "vendor": connection.vendor,
+                "users": options["users"],
+                "rewards": options["rewards"],
+                "due_ratio": options["due_ratio"],
+                "executed_ratio": options["executed_ratio"],
+                "bulk": options["bulk"],
+                "chunk_size": options["chunk_size"],
+            },
+            "processed": processed,
+            "duration_s": round(duration, 3),
+            "queries": counter.count,
+            "rows_per_sec": round(processed / duration, 1) if duration else 0,
+            "peak_memory_mb": round(peak_memory / 2**20, 2),
+        }
+
+    def compare(self, results: dict, baseline_path: str, threshold: float):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = []
+        for name, higher_is_better in COMPARED_METRICS.items():
+            old, new = baseline.get(name), results[name]
+            if not old:
+                continue
+            change = (new - old) / old
+            regressed = -change > threshold if higher_is_better else change > threshold
+            if regressed:
+                regressions.append(name)
+            self.stdout.write(
+                f"{name:<16} {old:>12} -> {new:<12} {change:+.1%}"
+                + (" REGRESSION" if regressed else "")
+            )
+
+        if regressions:
+            raise CommandError(
+                f"Regressions beyond {threshold:.0%}: {', '.join(regressions)}"
+            )
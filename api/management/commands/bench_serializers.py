@@ -0,0 +1,87 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import BENCH_USER_PREFIX, measure
+from api.fast_serializers import get_row_serializer
+from api.models import ScheduledReward, User
+from api.renderers import ORJSONRenderer
+from api.serializers import ScheduledRewardSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rendering a rewards list through the model serializer and the "
+        "JSON renderer with the values() fast path and the orjson renderer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10_000])
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--output", help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username=f"{BENCH_USER_PREFIX}_serializers")
+        try:
+            results = [
+                self.bench_rows(user, rows, options["repeat"])
+                for rows in options["rows"]
+            ]
+        finally:
+            user.delete()
+
+        for result in results:
+            self.stdout.write(
+                f"{result['rows']:>7} rows  model serializer "
+                f"{result['model_serializer']['median_ms']:>10} ms  fast path "
+                f"{result['fast_path']['median_ms']:>10} ms  "
+                f"speedup {result['speedup']}x"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    @staticmethod
+    def bench_rows(user: User, rows: int, repeat: int) -> dict:
+        ScheduledReward.objects.filter(user=user).delete()
+        now = timezone.now()
+        ScheduledReward.objects.bulk_create(
+            (
+                ScheduledReward(
+                    user=user,
+                    amount=index % 100 + 1,
+                    execute_at=now + timedelta(seconds=index),
+                    is_executed=index % 2 == 0,
+                )
+                for index in range(rows)
+            ),
+            batch_size=5000,
+        )
+        rewards = ScheduledReward.objects.filter(user=user).order_by("execute_at", "id")
+        row_serializer = get_row_serializer(ScheduledRewardSerializer)
+
+        def model_serializer():
+            data = ScheduledRewardSerializer(rewards.all(), many=True).data
+            return JSONRenderer().render(data)
+
+        def fast_path():
+            data = row_serializer.to_representation_many(
+                rewards.values(*row_serializer.sources)
+            )
+            return ORJSONRenderer().render(data)
+
+        # Both paths must produce the same response body
+        assert model_serializer() == fast_path()
+        model_timings = measure(model_serializer, repeat)
+        fast_timings = measure(fast_path, repeat)
+        return {
+            "rows": rows,
+            "model_serializer": model_timings,
+            "fast_path": fast_timings,
+            "speedup": round(model_timings["median_ms"] / fast_timings["median_ms"], 2),
+        }
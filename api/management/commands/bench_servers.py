@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+import httpx
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.benchmarks import BENCH_USER_PREFIX, run_load
+from api.models import ScheduledReward, User
+
+SERVER_COMMANDS = {
+    "wsgi": ["api_case.wsgi:application"],
+    "asgi": [
+        "api_case.asgi:application",
+        "--worker-class",
+        "uvicorn_worker.UvicornWorker",
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and tail latency of the API served by sync gunicorn "
+        "workers and by uvicorn workers with the async views"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--servers",
+            nargs="+",
+            choices=list(SERVER_COMMANDS),
+            default=list(SERVER_COMMANDS),
+        )
+        parser.add_argument(
+            "--paths", nargs="+", default=["/api/profile/", "/api/rewards/"]
+        )
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=3)
+        parser.add_argument("--port", type=int, default=8100)
+        parser.add_argument(
+            "--rewards", type=int, default=100, help="Rewards of the benchmark user"
+        )
+        parser.add_argument("--output", help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username=f"{BENCH_USER_PREFIX}_http")
+        ScheduledReward.objects.bulk_create(
+            ScheduledReward(
+                user=user,
+                amount=1,
+                execute_at=timezone.now() + timedelta(days=1, minutes=index),
+            )
+            for index in range(options["rewards"])
+        )
+        headers = {
+            "Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"
+        }
+        try:
+            results = {
+                server: self.bench_server(server, headers, options)
+                for server in options["servers"]
+            }
+        finally:
+            user.delete()
+
+        for server, paths in results.items():
+            for path, result in paths.items():
+                self.stdout.write(
+                    f"{server:<5} {path:<20} {result['rps']:>9} req/s  "
+                    f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+                    f"p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def bench_server(self, server: str, headers: dict, options: dict) -> dict:
+        base_url = f"http://127.0.0.1:{options['port']}"
+        self.stdout.write(f"Starting {server} server on {base_url}...")
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                *SERVER_COMMANDS[server],
+                "--workers",
+                str(options["workers"]),
+                "--bind",
+                f"127.0.0.1:{options['port']}",
+                "--log-level",
+                "warning",
+            ],
+            env={**os.environ, "API_SERVER": server},
+        )
+        try:
+            self.wait_until_ready(process, base_url + options["paths"][0], headers)
+            return {
+                path: asyncio.run(
+                    run_load(
+                        base_url + path,
+                        options["requests"],
+                        options["concurrency"],
+                        headers,
+                    )
+                )
+                for path in options["paths"]
+            }
+        finally:
+            process.terminate()
+            process.wait()
+
+    @staticmethod
+    def wait_until_ready(process, url: str, headers: dict, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Server exited with code {process.returncode}")
+            try:
+                httpx.get(url, headers=headers).raise_for_status()
+                return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        raise CommandError(f"Server did not answer {url} within {timeout}s")
@@ -0,0 +1,123 @@
+import json
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks import delete_seeded_data, measure, seed_rewards
+from api.models import DEFAULT_CHUNK_SIZE, RewardLog, ScheduledReward, User
+
+
+class Command(BaseCommand):
+    help = "Benchmark the hot queries of rewards, with EXPLAIN output and timings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed-users", type=int, default=0)
+        parser.add_argument("--seed-rewards", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--compare-without-indexes",
+            action="store_true",
+            help="Drop the reward indexes, measure again and recreate them",
+        )
+        parser.add_argument(
+            "--allow-dropping-indexes",
+            action="store_true",
+            help=(
+                "Confirm that the reward indexes of the configured database may be "
+                "dropped, queries of other clients run without them meanwhile"
+            ),
+        )
+        parser.add_argument(
+            "--keep-data",
+            action="store_true",
+            help="Do not delete the seeded data after the run",
+        )
+        parser.add_argument("--output", help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        if options["compare_without_indexes"] and not options["allow_dropping_indexes"]:
+            raise CommandError(
+                "--compare-without-indexes drops the reward indexes of the "
+                f"{connection.settings_dict['NAME']} database, confirm with "
+                "--allow-dropping-indexes"
+            )
+
+        seeded = bool(options["seed_users"] or options["seed_rewards"])
+        if seeded:
+            self.stdout.write("Seeding data...")
+            seed_rewards(max(options["seed_users"], 1), options["seed_rewards"])
+        try:
+            results = self.run(options)
+        finally:
+            # Pending seeded rewards would be paid out by the rewards sweep
+            if seeded and not options["keep_data"]:
+                delete_seeded_data()
+
+        for label in ("with_indexes", "without_indexes"):
+            for name, result in results.get(label, {}).items():
+                self.stdout.write(
+                    f"{label:<16} {name:<24} {result['median_ms']:>10} ms"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, options) -> dict:
+        results = {
+            "vendor": connection.vendor,
+            "rewards": ScheduledReward.objects.count(),
+            "reward_logs": RewardLog.objects.count(),
+            "with_indexes": self.run_queries(options["repeat"]),
+        }
+        if options["compare_without_indexes"]:
+            with self.indexes_dropped():
+                results["without_indexes"] = self.run_queries(options["repeat"])
+        return results
+
+    @staticmethod
+    def hot_queries() -> dict:
+        now = timezone.now()
+        today = now.date()
+        user = User.objects.order_by("?").first()
+        return {
+            "pending_rewards_chunk": ScheduledReward.objects.due(now)
+            .order_by("execute_at", "pk")
+            .only("id", "user", "amount", "execute_at", "is_executed")[
+                :DEFAULT_CHUNK_SIZE
+            ],
+            "award_once_per_day": ScheduledReward.objects.filter(
+                user=user, request_date=today
+            ),
+            "user_rewards_list": ScheduledReward.objects.filter(user=user),
+            "rewards_admin_list": ScheduledReward.objects.all()[:100],
+            "reward_logs_admin_list": RewardLog.objects.all()[:100],
+        }
+
+    def run_queries(self, repeat: int) -> dict:
+        return {
+            name: {
+                "explain": queryset.explain(),
+                **measure(lambda: list(queryset.all()), repeat),
+            }
+            for name, queryset in self.hot_queries().items()
+        }
+
+    @contextmanager
+    def indexes_dropped(self):
+        models = (ScheduledReward, RewardLog)
+        with connection.schema_editor() as editor:
+            for model in models:
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        try:
+            yield
+        finally:
+            self.stdout.write("Recreating indexes...")
+            with connection.schema_editor() as editor:
+                for model in models:
+                    for index in model._meta.indexes:
+                        editor.add_index(model, index)
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import schema
+
+
+class Command(BaseCommand):
+    help = "Pre-generate the OpenAPI schema files served at /api/schema/"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            type=Path,
+            default=None,
+            help="Directory of the schema files (default: SCHEMA_ROOT)",
+        )
+
+    def handle(self, *args, **options):
+        root = options["output_dir"] or Path(settings.SCHEMA_ROOT)
+        paths = schema.build(root)
+        if options["verbosity"] > 0:
+            for path in paths:
+                self.stdout.write(f"Wrote {path}")
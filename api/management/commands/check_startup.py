@@ -0,0 +1,85 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from api import schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify the static files manifest and the OpenAPI schema built into the "
+        "image and check for unapplied migrations, without building or migrating "
+        "by default"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help=(
+                "Collect static files, build the schema or apply migrations when "
+                "the check fails"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        problem = self.check_static_manifest()
+        if problem:
+            self.fail_or_fix(
+                problem, options["fix"], "collectstatic", interactive=False, clear=True
+            )
+
+        problem = self.check_schema()
+        if problem:
+            self.fail_or_fix(problem, options["fix"], "build_schema")
+
+        pending = self.pending_migrations()
+        if pending:
+            problem = f"{pending} unapplied migrations"
+            self.fail_or_fix(problem, options["fix"], "migrate", interactive=False)
+
+        self.stdout.write(
+            self.style.SUCCESS("Static files, schema and migrations are up to date")
+        )
+
+    def fail_or_fix(self, problem: str, fix: bool, command: str, **options):
+        if not fix:
+            raise CommandError(problem)
+        self.stdout.write(f"{problem}, running {command}")
+        call_command(command, verbosity=0, **options)
+
+    @staticmethod
+    def check_static_manifest() -> str | None:
+        """Describe what is wrong with the manifest, None if it is complete"""
+        if not hasattr(staticfiles_storage, "load_manifest"):
+            return None
+        if not staticfiles_storage.exists(staticfiles_storage.manifest_name):
+            return "Missing static files manifest"
+        hashed_files, _ = staticfiles_storage.load_manifest()
+        missing = [
+            name
+            for name in hashed_files.values()
+            if not staticfiles_storage.exists(name)
+        ]
+        if missing:
+            return f"{len(missing)} static files of the manifest are missing"
+        return None
+
+    @staticmethod
+    def check_schema() -> str | None:
+        """Describe which schema files were not built, None if all exist"""
+        root = Path(settings.SCHEMA_ROOT)
+        missing = [name for name in schema.file_names() if not (root / name).exists()]
+        if missing:
+            return f"Missing pre-generated schema files: {', '.join(missing)}"
+        return None
+
+    @staticmethod
+    def pending_migrations() -> int:
+        executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        return len(executor.migration_plan(executor.loader.graph.leaf_nodes()))
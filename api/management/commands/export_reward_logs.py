@@ -0,0 +1,49 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from api import exports
+from api.models import RewardLog
+
+
+class Command(BaseCommand):
+    help = "Stream reward logs as CSV or NDJSON, with constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output-format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument(
+            "--file", help="Write to this file instead of the standard output"
+        )
+        parser.add_argument("--user", help="Export logs of this username only")
+        parser.add_argument("--start", type=self.parse_datetime, help="given_at from")
+        parser.add_argument("--end", type=self.parse_datetime, help="given_at before")
+        parser.add_argument("--chunk-size", type=int, default=exports.EXPORT_CHUNK_SIZE)
+
+    @staticmethod
+    def parse_datetime(value: str) -> datetime:
+        parsed = parse_datetime(value)
+        if parsed is None and (day := parse_date(value)):
+            parsed = datetime.combine(day, time.min)
+        if parsed is None:
+            raise ValueError(f"Invalid date/time {value!r}")
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+    def handle(self, *args, **options):
+        reward_logs = RewardLog.objects.all()
+        if options["user"]:
+            reward_logs = reward_logs.filter(user__username=options["user"])
+        reward_logs = exports.filter_reward_logs(
+            reward_logs, options["start"], options["end"]
+        )
+
+        lines = exports.export(
+            reward_logs, options["output_format"], options["chunk_size"]
+        )
+        if options["file"]:
+            with open(options["file"], "w", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
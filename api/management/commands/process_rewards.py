@@ -1,21 +1,72 @@
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
-from api.models import ScheduledReward
+from api import next_due, processing
+from api.models import DEFAULT_CHUNK_SIZE, ScheduledReward
 
 
 class Command(BaseCommand):
     help = "Process all pending scheduled rewards"
 
-    def handle(self, *args, **options):
-        pending_rewards = ScheduledReward.objects.filter(
-            is_executed=False, execute_at__lte=timezone.now()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Execute rewards with set-based queries in chunks",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Rewards per chunk in bulk mode (default: {DEFAULT_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            "--partition",
+            metavar="INDEX/COUNT",
+            help="Process only rewards of users hashed into partition INDEX of COUNT",
+        )
+        parser.add_argument(
+            "--from-index",
+            action="store_true",
+            help="Pop due reward ids from the Redis due-index, implies --bulk",
         )
 
-        count = 0
-        for reward in pending_rewards:
-            if reward.execute():
-                count += 1
-                self.stdout.write(f"Processed reward: {reward}")
+    def handle(self, *args, **options):
+        now = timezone.now()
 
+        if options["from_index"]:
+            count = processing.execute_from_index(
+                now, options["chunk_size"], self.report
+            )
+        else:
+            count = self.process_pending(now, options)
+        if settings.REWARDS_NEXT_DUE_HINT:
+            next_due.refresh()
         self.stdout.write(f"Successfully processed {count} rewards")
+
+    def process_pending(self, now, options) -> int:
+        pending_rewards = ScheduledReward.objects.due(now)
+        if options["partition"]:
+            pending_rewards = pending_rewards.partition(
+                *self.parse_partition(options["partition"])
+            )
+
+        if options["bulk"]:
+            return processing.execute_bulk(
+                pending_rewards, options["chunk_size"], self.report
+            )
+        return processing.execute_each(pending_rewards, self.report)
+
+    @staticmethod
+    def parse_partition(value: str) -> tuple[int, int]:
+        try:
+            index, count = map(int, value.split("/"))
+        except ValueError:
+            raise CommandError(f"Invalid partition {value!r}, expected INDEX/COUNT")
+        if not 0 <= index < count:
+            raise CommandError(f"Partition index must be in range 0..{count - 1}")
+        return index, count
+
+    def report(self, reward: ScheduledReward):
+        self.stdout.write(f"Processed reward: {reward}")
@@ -0,0 +1,47 @@
+from itertools import batched
+
+from django.core.management.base import BaseCommand
+
+from api import due_index
+from api.models import DEFAULT_CHUNK_SIZE, ScheduledReward
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Redis due-index of pending scheduled rewards from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Rewards per Redis round-trip (default: {DEFAULT_CHUNK_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        pending_rewards = (
+            ScheduledReward.objects.filter(is_executed=False)
+            .only("id", "execute_at")
+            .order_by("pk")
+        )
+        indexed = 0
+        for rewards in batched(pending_rewards.iterator(chunk_size), chunk_size):
+            due_index.add(rewards)
+            indexed += len(rewards)
+
+        # Drop ids of rewards that were executed or deleted meanwhile
+        removed = 0
+        for reward_ids in batched(due_index.iter_ids(), chunk_size):
+            pending_ids = set(
+                ScheduledReward.objects.filter(
+                    pk__in=reward_ids, is_executed=False
+                ).values_list("pk", flat=True)
+            )
+            stale_ids = [pk for pk in reward_ids if pk not in pending_ids]
+            due_index.remove(stale_ids)
+            removed += len(stale_ids)
+
+        self.stdout.write(
+            f"Indexed {indexed} pending rewards, removed {removed} stale entries"
+        )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from api import ledger
+from api.models import DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Verify that coins of every user equal the sum of their reward logs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Users checked per query (default: {DEFAULT_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Set coins of drifted users to their reward log totals",
+        )
+
+    def handle(self, *args, **options):
+        checked, drifted, repaired = 0, 0, 0
+        for count, balances in ledger.iter_drift(options["chunk_size"]):
+            checked += count
+            drifted += len(balances)
+            for balance in balances:
+                self.stdout.write(
+                    f"User {balance['pk']}: coins {balance['coins']}, "
+                    f"reward logs {balance['ledger']}"
+                )
+            if balances and options["repair"]:
+                repaired += ledger.repair([balance["pk"] for balance in balances])
+
+        style = self.style.WARNING if drifted > repaired else self.style.SUCCESS
+        self.stdout.write(
+            style(f"Checked {checked} users, {drifted} drifted, {repaired} repaired")
+        )
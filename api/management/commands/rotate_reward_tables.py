@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import maintenance
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly partitions of the reward log and move executed "
+        "rewards past the retention window to the archive table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--archive-after-days",
+            type=int,
+            default=settings.REWARDS_ARCHIVE_AFTER_DAYS,
+            help="Archive rewards executed more than this many days ago",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.REWARDS_ARCHIVE_BATCH_SIZE,
+            help="Rewards moved per transaction",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after this many batches (default: until done)",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.REWARD_LOG_PARTITIONS_AHEAD,
+            help="Monthly reward log partitions to create in advance",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        created = maintenance.rotate_reward_log_partitions(
+            now.date(), options["months_ahead"]
+        )
+        for name in created:
+            self.stdout.write(f"Created reward log partition: {name}")
+
+        archived = maintenance.archive_executed_rewards(
+            now - timedelta(days=options["archive_after_days"]),
+            options["batch_size"],
+            options["max_batches"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} rewards"))
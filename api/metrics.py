@@ -0,0 +1,106 @@
+"""
+Prometheus metrics of the API.
+
+Under gunicorn the metrics are collected in multiprocess mode: every worker
+writes its samples to memory-mapped files in PROMETHEUS_MULTIPROC_DIR, and
+the /metrics endpoint aggregates the files of all workers. Celery workers do
+the same and serve the reward pipeline metrics on CELERY_METRICS_PORT.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+REQUEST_LATENCY = Histogram(
+    "api_request_duration_seconds",
+    "Latency of API requests",
+    ["view", "method"],
+)
+REQUESTS = Counter(
+    "api_requests",
+    "Handled API requests",
+    ["view", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "api_request_db_queries",
+    "Database queries per API request",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_DURATION = Histogram(
+    "api_request_db_duration_seconds",
+    "Time spent in database queries per API request",
+    ["view"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+RESPONSE_SIZE = Histogram(
+    "api_response_size_bytes",
+    "Size of API response bodies",
+    ["view"],
+    buckets=(100, 300, 1_000, 3_000, 10_000, 30_000, 100_000, 300_000, 1_000_000),
+)
+
+REWARDS_BACKLOG = Gauge(
+    "rewards_backlog",
+    "Due rewards waiting for execution at the start of the last processor run",
+    multiprocess_mode="mostrecent",
+)
+REWARDS_PROCESSED = Counter(
+    "rewards_processed",
+    "Executed scheduled rewards",
+    ["task"],
+)
+REWARDS_THROUGHPUT = Gauge(
+    "rewards_throughput_per_second",
+    "Rewards executed per second by the last run of the task",
+    ["task"],
+    multiprocess_mode="mostrecent",
+)
+REWARD_RUN_DURATION = Histogram(
+    "rewards_run_duration_seconds",
+    "Duration of reward processing task runs",
+    ["task"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 900, 1800),
+)
+REWARD_CHUNK_DURATION = Histogram(
+    "rewards_chunk_db_duration_seconds",
+    "Database time of one chunk of the bulk reward processing",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+REWARD_LAG = Histogram(
+    "rewards_execution_lag_seconds",
+    "Delay between the scheduled and the actual execution time of rewards",
+    buckets=(1, 5, 15, 30, 60, 90, 120, 300, 600, 1800, 3600),
+)
+
+
+def get_registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Expose metrics in the Prometheus text format"""
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
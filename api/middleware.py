@@ -0,0 +1,196 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Callable, ContextManager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from api import metrics, replicas
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their total duration"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+# Timer of the current request. Async views run their queries on
+# sync_to_async threads with connections of their own, which get a copy of
+# the context but not the execute wrappers entered by the middleware.
+request_queries: ContextVar[QueryTimer | None] = ContextVar(
+    "request_queries", default=None
+)
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper of every connection, timing the queries of a request"""
+    timer = request_queries.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def stream_within(response, context: Callable[[], ContextManager]) -> None:
+    """
+    Iterate the streamed body of the response within a new context.
+
+    Streamed bodies run their queries while the server iterates them, after
+    the middleware returned.
+    """
+    content = response.streaming_content
+    if response.is_async:
+
+        async def wrapped():
+            with context():
+                async for part in content:
+                    yield part
+
+    else:
+
+        def wrapped():
+            with context():
+                yield from content
+
+    response.streaming_content = wrapped()
+
+
+class MetricsMiddleware:
+    """Record latency, database usage and response size of every request per view"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer, started = QueryTimer(), time.perf_counter()
+        with self.timed_queries(timer):
+            response = self.get_response(request)
+        return self.finish(request, response, timer, started)
+
+    async def __acall__(self, request):
+        timer, started = QueryTimer(), time.perf_counter()
+        with self.timed_queries(timer):
+            response = await self.get_response(request)
+        return self.finish(request, response, timer, started)
+
+    def finish(self, request, response, timer: QueryTimer, started: float):
+        if response.streaming:
+            # Measured once the body was sent, with the queries producing it
+            stream_within(
+                response, partial(self.streamed, request, response, timer, started)
+            )
+        else:
+            self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    @contextmanager
+    def timed_queries(timer: QueryTimer):
+        token = request_queries.set(timer)
+        try:
+            yield
+        finally:
+            request_queries.reset(token)
+
+    @contextmanager
+    def streamed(self, request, response, timer: QueryTimer, started: float):
+        try:
+            with self.timed_queries(timer):
+                yield
+        finally:
+            self.record(request, response, timer, time.perf_counter() - started)
+
+    @staticmethod
+    def record(request, response, timer: QueryTimer, duration: float) -> None:
+        # Route names keep the label cardinality bounded, unlike raw paths
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        metrics.REQUEST_LATENCY.labels(view, request.method).observe(duration)
+        metrics.REQUESTS.labels(view, request.method, response.status_code).inc()
+        metrics.REQUEST_DB_QUERIES.labels(view).observe(timer.count)
+        metrics.REQUEST_DB_DURATION.labels(view).observe(timer.duration)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(view).observe(len(response.content))
+
+
+class ReplicaMiddleware:
+    """Serve safe requests from the read replica, unless the client wrote recently"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replicas.replica_configured():
+            return self.get_response(request)
+
+        with replicas.replica_reads(self.reads_enabled(request)):
+            response = self.get_response(request)
+            self.keep_routing(response)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas.replica_configured():
+            return await self.get_response(request)
+
+        # sync_to_async copies the context, the ORM threads see the routing
+        with replicas.replica_reads(self.reads_enabled(request)):
+            response = await self.get_response(request)
+            self.keep_routing(response)
+        self.pin(request, response)
+        return response
+
+    @staticmethod
+    def keep_routing(response) -> None:
+        # Streamed exports read while the body is sent, from the database the
+        # request was routed to, the primary if the view pinned it meanwhile
+        if response.streaming:
+            enabled = replicas.replica_reads_enabled()
+            stream_within(response, partial(replicas.replica_reads, enabled))
+
+    @staticmethod
+    def reads_enabled(request) -> bool:
+        return (
+            request.method in SAFE_METHODS
+            and replicas.PIN_COOKIE not in request.COOKIES
+        )
+
+    @staticmethod
+    def pin(request, response) -> None:
+        # Clients keeping cookies read their writes from the primary, JWT
+        # clients are pinned by the cache version of the user as well
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                replicas.PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
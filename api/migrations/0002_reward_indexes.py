@@ -0,0 +1,40 @@
+# Generated by Django 5.1.8 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="rewardlog",
+            index=models.Index(fields=["-given_at"], name="rewardlog_given_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledreward",
+            index=models.Index(
+                fields=["is_executed", "execute_at", "id", "user", "amount"],
+                name="reward_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledreward",
+            index=models.Index(
+                fields=["user", "created_at"], name="reward_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledreward",
+            index=models.Index(
+                fields=["user", "execute_at"], name="reward_user_execute_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledreward",
+            index=models.Index(fields=["execute_at"], name="reward_execute_at_idx"),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.8 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_request_date(apps, schema_editor):
+    """
+    Set request_date from created_at, walking rewards in (user, id) order in chunks.
+
+    Only the first request of a user per day gets a date, later duplicates keep
+    NULL, so the unique constraint can be created on existing data.
+    """
+    ScheduledReward = apps.get_model("api", "ScheduledReward")
+    rewards = ScheduledReward.objects.order_by("user_id", "id").only(
+        "id", "user_id", "created_at"
+    )
+
+    last_user_id, last_id, seen_dates = 0, 0, set()
+    while True:
+        chunk = list(
+            rewards.filter(
+                models.Q(user_id__gt=last_user_id)
+                | models.Q(user_id=last_user_id, id__gt=last_id)
+            )[:BACKFILL_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+
+        updated = []
+        for reward in chunk:
+            if reward.user_id != last_user_id:
+                last_user_id, seen_dates = reward.user_id, set()
+            request_date = reward.created_at.date()
+            if request_date not in seen_dates:
+                seen_dates.add(request_date)
+                reward.request_date = request_date
+                updated.append(reward)
+        ScheduledReward.objects.bulk_update(updated, ["request_date"])
+        last_id = chunk[-1].id
+
+
+class Migration(migrations.Migration):
+    # Commit every chunk of the backfill on its own
+    atomic = False
+
+    dependencies = [
+        ("api", "0002_reward_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scheduledreward",
+            name="request_date",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_request_date, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="scheduledreward",
+            constraint=models.UniqueConstraint(
+                fields=("user", "request_date"), name="reward_user_request_date_uniq"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="scheduledreward",
+            name="reward_user_created_idx",
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.8 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def partition_reward_log(apps, schema_editor):
+    """
+    Partition the reward log by month of given_at on MariaDB.
+
+    Existing rows go to a single history partition, monthly partitions are split
+    off the catch-all pmax partition by the rotate_reward_tables command.
+    """
+    if schema_editor.connection.vendor != "mysql":
+        return
+    table = apps.get_model("api", "RewardLog")._meta.db_table
+    month_start = timezone.localdate().replace(day=1)
+    # Every unique key of a partitioned table must contain the partitioning column
+    schema_editor.execute(
+        f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, given_at)"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(given_at)) ("
+        f"PARTITION p_history VALUES LESS THAN (TO_DAYS('{month_start}')), "
+        "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+
+
+def unpartition_reward_log(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    table = apps.get_model("api", "RewardLog")._meta.db_table
+    schema_editor.execute(f"ALTER TABLE {table} REMOVE PARTITIONING")
+    schema_editor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_reward_request_date"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="rewardlog",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reward_logs",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="User",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ScheduledRewardArchive",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("amount", models.IntegerField(verbose_name="Amount of coins")),
+                ("execute_at", models.DateTimeField(verbose_name="Execution time")),
+                ("created_at", models.DateTimeField()),
+                ("request_date", models.DateField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived award",
+                "verbose_name_plural": "Archived awards",
+            },
+        ),
+        migrations.RunPython(partition_reward_log, unpartition_reward_log),
+    ]
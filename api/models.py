@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Mod
 from django.utils import timezone
 
+from api import due_index, user_cache
+
+DEFAULT_CHUNK_SIZE = 1000
+
 
 class User(AbstractUser):
     coins = models.IntegerField(default=0)
@@ -10,6 +17,76 @@ class User(AbstractUser):
         return self.username
 
 
+class ScheduledRewardQuerySet(models.QuerySet):
+    def due(self, now=None):
+        return self.filter(is_executed=False, execute_at__lte=now or timezone.now())
+
+    def after(self, execute_at, pk: int):
+        """Rewards ordered after the given (execute_at, id) keyset position"""
+        return self.filter(
+            Q(execute_at__gt=execute_at) | Q(execute_at=execute_at, pk__gt=pk)
+        )
+
+    def partition(self, index: int, count: int):
+        """Rewards of users whose id hashes into the given partition"""
+        return self.alias(partition=Mod("user_id", count)).filter(partition=index)
+
+    def execute_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Execute rewards of the queryset with set-based queries, chunk by chunk.
+
+        Every chunk costs a constant number of queries: one locked SELECT, one
+        user fetch for the output, one UPDATE of balances, one bulk INSERT of
+        reward logs and one UPDATE of the executed flags. Yields the list of
+        executed rewards after each chunk is committed.
+        """
+        while True:
+            with transaction.atomic():
+                rewards = list(
+                    self.filter(is_executed=False)
+                    .order_by("execute_at", "pk")
+                    .only("id", "user", "amount", "execute_at", "is_executed")
+                    .select_for_update(skip_locked=True)
+                    .prefetch_related("user")[:chunk_size]
+                )
+                if not rewards:
+                    return
+
+                totals = {}
+                for reward in rewards:
+                    totals[reward.user_id] = (
+                        totals.get(reward.user_id, 0) + reward.amount
+                    )
+                User.objects.filter(pk__in=totals).update(
+                    coins=F("coins")
+                    + Case(
+                        *(
+                            When(pk=user_id, then=total)
+                            for user_id, total in totals.items()
+                        ),
+                        output_field=models.IntegerField(),
+                    )
+                )
+                RewardLog.objects.bulk_create(
+                    RewardLog(
+                        user_id=reward.user_id,
+                        amount=reward.amount,
+                        reason=f"Scheduled reward (ID: {reward.id})",
+                    )
+                    for reward in rewards
+                )
+                ScheduledReward.objects.filter(
+                    pk__in=[reward.pk for reward in rewards]
+                ).update(is_executed=True)
+
+            user_cache.bump_versions(totals)
+            if settings.REWARDS_DUE_INDEX:
+                due_index.remove(reward.pk for reward in rewards)
+            for reward in rewards:
+                reward.is_executed = True
+            yield rewards
+
+
 class ScheduledReward(models.Model):
     user = models.ForeignKey(
         "User",
@@ -21,19 +98,50 @@ class ScheduledReward(models.Model):
     execute_at = models.DateTimeField(verbose_name="Execution time")
     is_executed = models.BooleanField(default=False, verbose_name="Is executed")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Day of the award request, one request per user and day is allowed
+    request_date = models.DateField(null=True, blank=True, editable=False)
+
+    objects = ScheduledRewardQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Scheduled awards"
         verbose_name_plural = "Scheduled awards"
         ordering = ["execute_at"]
+        indexes = [
+            # Pending rewards scan, in the order and with the columns the bulk
+            # engine reads, so chunks are served from the index alone
+            models.Index(
+                fields=["is_executed", "execute_at", "id", "user", "amount"],
+                name="reward_pending_idx",
+            ),
+            # Rewards list of a user
+            models.Index(fields=["user", "execute_at"], name="reward_user_execute_idx"),
+            models.Index(fields=["execute_at"], name="reward_execute_at_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "request_date"], name="reward_user_request_date_uniq"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.amount} coins to be given for {self.user.username} at {self.execute_at}"
 
     def execute(self):
-        if not self.is_executed and timezone.now() >= self.execute_at:
-            self.user.coins += self.amount
-            self.user.save()
+        if self.is_executed or timezone.now() < self.execute_at:
+            return False
+
+        with transaction.atomic():
+            # Claim the reward, a concurrent execution updates no row
+            claimed = ScheduledReward.objects.filter(
+                pk=self.pk, is_executed=False
+            ).update(is_executed=True)
+            if not claimed:
+                return False
+
+            self.user.coins = F("coins") + self.amount
+            self.user.save(update_fields=["coins"])
+            self.user.refresh_from_db(fields=["coins"])
 
             # Create reward log
             RewardLog.objects.create(
@@ -41,19 +149,47 @@ class ScheduledReward(models.Model):
                 amount=self.amount,
                 reason=f"Scheduled reward (ID: {self.id})",
             )
+        self.is_executed = True
+
+        user_cache.bump_versions([self.user_id])
+        if settings.REWARDS_DUE_INDEX:
+            due_index.remove([self.pk])
+        return True
 
-            self.is_executed = True
-            self.save()
-            return True
 
-        return False
+class ScheduledRewardArchive(models.Model):
+    """Executed scheduled rewards past the retention window, without secondary indexes"""
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        "User",
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_constraint=False,
+        db_index=False,
+        verbose_name="User",
+    )
+    amount = models.IntegerField(verbose_name="Amount of coins")
+    execute_at = models.DateTimeField(verbose_name="Execution time")
+    created_at = models.DateTimeField()
+    request_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Archived award"
+        verbose_name_plural = "Archived awards"
+
+    def __str__(self):
+        return f"{self.amount} coins given to user {self.user_id} at {self.execute_at}"
 
 
 class RewardLog(models.Model):
+    # Partitioned InnoDB tables can not have foreign keys, the cascade is done by
+    # the ORM only
     user = models.ForeignKey(
         "User",
         on_delete=models.CASCADE,
         related_name="reward_logs",
+        db_constraint=False,
         verbose_name="User",
     )
     amount = models.IntegerField(verbose_name="Coins amount")
@@ -66,6 +202,9 @@ class RewardLog(models.Model):
         verbose_name = "Reward log"
         verbose_name_plural = "Reward logs"
         ordering = ["-given_at"]
+        indexes = [
+            models.Index(fields=["-given_at"], name="rewardlog_given_at_idx"),
+        ]
 
     def __str__(self):
         return (
@@ -0,0 +1,95 @@
+"""
+Redis hint of the earliest execution time of pending scheduled rewards.
+
+New rewards lower the hint, the processor recomputes it from the database after
+each run. Celery beat reads it to skip periodic sweeps while nothing is due.
+The hint expires after REWARDS_NEXT_DUE_MAX_AGE, beat then falls back to the
+plain crontab until the next run refreshes it.
+"""
+
+import math
+from datetime import datetime
+
+import redis
+
+from django.conf import settings
+
+from api.redis_client import get_redis
+
+HINT_KEY = "rewards:next_due"
+# Stored instead of a timestamp when no reward is pending
+NOTHING_PENDING = "none"
+
+# Every note bumps the version, so a refresh computed before a concurrent note
+# does not overwrite the lowered hint with a later execution time
+NOTE_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+local at = redis.call('HGET', KEYS[1], 'at')
+if at == ARGV[2] or (at and tonumber(at) > tonumber(ARGV[1])) then
+    redis.call('HSET', KEYS[1], 'at', ARGV[1])
+end
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+"""
+
+REFRESH_SCRIPT = """
+if (redis.call('HGET', KEYS[1], 'version') or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'at', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+def note(execute_at: datetime) -> None:
+    """Lower the hint to the execution time of a new pending reward"""
+    get_redis().eval(
+        NOTE_SCRIPT,
+        1,
+        HINT_KEY,
+        execute_at.timestamp(),
+        NOTHING_PENDING,
+        settings.REWARDS_NEXT_DUE_MAX_AGE,
+    )
+
+
+def refresh() -> bool:
+    """Recompute the hint from the database, unless a reward was noted meanwhile"""
+    from api.models import ScheduledReward
+
+    version = get_redis().hget(HINT_KEY, "version") or b""
+    execute_at = (
+        ScheduledReward.objects.filter(is_executed=False)
+        .order_by("execute_at")
+        .values_list("execute_at", flat=True)
+        .first()
+    )
+    at = execute_at.timestamp() if execute_at else NOTHING_PENDING
+    return bool(
+        get_redis().eval(
+            REFRESH_SCRIPT,
+            1,
+            HINT_KEY,
+            version,
+            at,
+            settings.REWARDS_NEXT_DUE_MAX_AGE,
+        )
+    )
+
+
+def get() -> float | None:
+    """
+    Timestamp of the earliest pending reward, math.inf when nothing is pending,
+    None when the hint is unknown or Redis is unavailable
+    """
+    try:
+        at = get_redis().hget(HINT_KEY, "at")
+    except redis.RedisError:
+        return None
+    if at is None:
+        return None
+    if at.decode() == NOTHING_PENDING:
+        return math.inf
+    return float(at)
@@ -0,0 +1,11 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class RewardsCursorPagination(CursorPagination):
+    """Keyset pagination, deep pages cost the same as the first one"""
+
+    ordering = ("execute_at", "id")
+    page_size = settings.REWARDS_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.REWARDS_MAX_PAGE_SIZE
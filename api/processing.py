@@ -0,0 +1,119 @@
+"""
+Execution of due scheduled rewards, shared by the process_rewards command and
+the Celery tasks. Executed rewards are passed to the optional `report` callback.
+"""
+
+import time
+from datetime import datetime
+from typing import Callable
+
+from django.utils import timezone
+
+from api import due_index, metrics
+from api.leases import Lease
+from api.models import ScheduledReward
+from api.redis_client import get_redis
+
+Report = Callable[[ScheduledReward], None] | None
+
+CHECKPOINT_KEY = "rewards:checkpoint"
+CHECKPOINT_TTL = 24 * 60 * 60
+
+
+def execute_each(pending_rewards, report: Report = None) -> int:
+    count = 0
+    for reward in pending_rewards:
+        if reward.execute():
+            count += 1
+            _executed([reward], report)
+    return count
+
+
+def execute_bulk(pending_rewards, chunk_size: int, report: Report = None) -> int:
+    count = 0
+    started = time.perf_counter()
+    for rewards in pending_rewards.execute_chunks(chunk_size):
+        metrics.REWARD_CHUNK_DURATION.observe(time.perf_counter() - started)
+        _executed(rewards, report)
+        count += len(rewards)
+        started = time.perf_counter()
+    return count
+
+
+def execute_from_index(now: datetime, chunk_size: int, report: Report = None) -> int:
+    count = 0
+    while scores := due_index.pop_due(now, chunk_size):
+        popped_rewards = ScheduledReward.objects.filter(pk__in=scores)
+        try:
+            count += execute_bulk(popped_rewards.due(now), chunk_size, report)
+        except Exception:
+            due_index.restore(scores)
+            raise
+        # Rewards moved to a later time go back with their current score
+        due_index.add(
+            popped_rewards.filter(is_executed=False, execute_at__gt=now).only(
+                "id", "execute_at"
+            )
+        )
+    return count
+
+
+def execute_resumable(
+    pending_rewards,
+    chunk_size: int,
+    budget: float,
+    lease: Lease,
+    report: Report = None,
+) -> int:
+    """
+    Execute rewards in chunks from the checkpoint of the previous run on.
+
+    The run stops after the chunk that exhausts the time budget, or when the
+    lease was lost, the next run resumes after the last executed reward.
+    The checkpoint is saved after every chunk, so a killed run is resumed as
+    well. A run that gets through all due rewards clears it, rewards skipped
+    before the checkpoint are then picked up again by the next run.
+    """
+    checkpoint = load_checkpoint()
+    if checkpoint:
+        pending_rewards = pending_rewards.after(*checkpoint)
+
+    count = 0
+    deadline = time.monotonic() + budget
+    started = time.perf_counter()
+    for rewards in pending_rewards.execute_chunks(chunk_size):
+        metrics.REWARD_CHUNK_DURATION.observe(time.perf_counter() - started)
+        save_checkpoint(rewards[-1])
+        _executed(rewards, report)
+        count += len(rewards)
+        if time.monotonic() >= deadline or not lease.heartbeat():
+            return count
+        started = time.perf_counter()
+
+    clear_checkpoint()
+    return count
+
+
+def load_checkpoint() -> tuple[datetime, int] | None:
+    checkpoint = get_redis().get(CHECKPOINT_KEY)
+    if checkpoint is None:
+        return None
+    execute_at, pk = checkpoint.decode().split("|")
+    return datetime.fromisoformat(execute_at), int(pk)
+
+
+def save_checkpoint(reward: ScheduledReward) -> None:
+    checkpoint = f"{reward.execute_at.isoformat()}|{reward.pk}"
+    get_redis().set(CHECKPOINT_KEY, checkpoint, ex=CHECKPOINT_TTL)
+
+
+def clear_checkpoint() -> None:
+    get_redis().delete(CHECKPOINT_KEY)
+
+
+def _executed(rewards: list[ScheduledReward], report: Report):
+    now = timezone.now()
+    for reward in rewards:
+        metrics.REWARD_LAG.observe((now - reward.execute_at).total_seconds())
+        if report:
+            report(reward)
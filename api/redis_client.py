@@ -0,0 +1,11 @@
+from functools import cache
+
+import redis
+
+from django.conf import settings
+
+
+@cache
+def get_redis() -> redis.Redis:
+    """Redis client shared by the process, connections are pooled by the client"""
+    return redis.Redis.from_url(settings.REDIS_URL)
@@ -0,0 +1,60 @@
+import orjson
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer on orjson, producing the bytes of the DRF JSON renderer.
+
+    Datetimes and other values orjson formats on its own are passed to the DRF
+    encoder. Floats are written in orjson notation, e.g. 1e-7 instead of 1e-07,
+    so the renderer is meant for views without float fields. Indented, ASCII
+    or non-compact output is left to the DRF renderer.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            # E.g. integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by the DRF renderer to output a strict javascript subset
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Accepts the media type of an export format, the view streams the export
+    itself. Errors raised before the export starts are rendered as JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+
+class CSVExportRenderer(ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONExportRenderer(ExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
@@ -0,0 +1,62 @@
+"""
+Routing of reads to the read replica, with read-your-writes stickiness.
+
+Reads go to the primary unless replica reads were enabled for the current
+context, which only the middleware does, for safe requests of clients that did
+not write within the last REPLICA_STICKY_SECONDS. Celery tasks and management
+commands, the reward processor included, always use the primary.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DATABASE = "replica"
+PIN_COOKIE = "primary_pinned"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def replica_configured() -> bool:
+    return REPLICA_DATABASE in settings.DATABASES
+
+
+@contextmanager
+def replica_reads(enabled: bool = True):
+    token = _replica_reads.set(enabled and replica_configured())
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads_enabled() -> bool:
+    return _replica_reads.get()
+
+
+def pin_to_primary() -> None:
+    """Read from the primary for the rest of the current request"""
+    _replica_reads.set(False)
+
+
+def pin_if_recent(version: int) -> None:
+    """Pin to the primary if the user cache version was bumped by a recent write"""
+    if time.time_ns() - version < settings.REPLICA_STICKY_SECONDS * 10**9:
+        pin_to_primary()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA_DATABASE if _replica_reads.get() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Later reads of the request must see the write
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
@@ -0,0 +1,116 @@
+"""
+Pre-generated OpenAPI schema.
+
+The build_schema command renders the schema once per format into
+SCHEMA_ROOT, with a gzip variant next to each file. CachedSchemaView serves
+the files with a strong ETag per variant and long cache headers, and falls
+back to live generation in DEBUG or when the files are missing.
+"""
+
+import gzip
+import hashlib
+import re
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+RENDERERS = (OpenApiYamlRenderer(), OpenApiJsonRenderer())
+
+# A content coding of Accept-Encoding with its optional quality value
+CODING_RE = re.compile(r"\s*(?P<coding>[^\s;]+)\s*(?:;\s*q\s*=\s*(?P<q>[\d.]+))?")
+
+
+@dataclass(frozen=True)
+class SchemaFile:
+    content: bytes
+    etag: str
+
+
+def build(root: Path) -> list[Path]:
+    """Render the schema into every served format, return the written files"""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    root.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for renderer in RENDERERS:
+        content = renderer.render(schema, renderer_context={})
+        path = root / f"schema.{renderer.format}"
+        path.write_bytes(content)
+        compressed_path = path.with_name(f"{path.name}.gz")
+        compressed_path.write_bytes(gzip.compress(content, mtime=0))
+        paths += [path, compressed_path]
+    return paths
+
+
+def file_names() -> list[str]:
+    """Names of the files written by build"""
+    names = [f"schema.{renderer.format}" for renderer in RENDERERS]
+    return names + [f"{name}.gz" for name in names]
+
+
+@cache
+def read(path: Path) -> SchemaFile:
+    """Read a pre-generated schema file once per process"""
+    content = path.read_bytes()
+    return SchemaFile(content, quote_etag(hashlib.sha256(content).hexdigest()[:32]))
+
+
+def load(root: Path, name: str) -> SchemaFile | None:
+    """The pre-generated schema file, None while it is not built"""
+    try:
+        # Misses raise and are not cached, a later build is picked up
+        return read(root / name)
+    except FileNotFoundError:
+        return None
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether gzip is listed in Accept-Encoding without a zero quality"""
+    for coding in accept_encoding.split(","):
+        match = CODING_RE.match(coding)
+        if match and match["coding"].lower() == "gzip":
+            try:
+                return float(match["q"] or 1) > 0
+            except ValueError:
+                return False
+    return False
+
+
+class CachedSchemaView(SpectacularAPIView):
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if settings.DEBUG or request.GET.keys() & {"lang", "version"}:
+            return super().get(request, *args, **kwargs)
+
+        gzipped = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+        name = f"schema.{request.accepted_renderer.format}"
+        schema = load(Path(settings.SCHEMA_ROOT), f"{name}.gz" if gzipped else name)
+        if schema is None:
+            return super().get(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=schema.etag)
+        if response is None:
+            response = HttpResponse(schema.content, content_type=self.content_type())
+            response["Content-Disposition"] = (
+                f'inline; filename="{self._get_filename(request, None)}"'
+            )
+            if gzipped:
+                response["Content-Encoding"] = "gzip"
+        response["ETag"] = schema.etag
+        response["Cache-Control"] = f"public, max-age={settings.SCHEMA_MAX_AGE}"
+        patch_vary_headers(response, ["Accept", "Accept-Encoding"])
+        return response
+
+    def content_type(self) -> str:
+        charset = self.request.accepted_renderer.charset
+        media_type = self.request.accepted_media_type
+        return f"{media_type}; charset={charset}" if charset else media_type
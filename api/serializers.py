@@ -1,9 +1,17 @@
 from datetime import timedelta
 
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.settings import api_settings
 
+from api import user_cache
 from api.models import ScheduledReward, User
+from api.tasks import schedule_reward
 
 MAX_AMOUNT = 100
 
@@ -15,6 +23,27 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ["coins"]
 
 
+class CacheStatsSerializer(serializers.Serializer):
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+
+
+class RewardLogExportSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+    start = serializers.DateTimeField(required=False, help_text="given_at from")
+    end = serializers.DateTimeField(required=False, help_text="given_at before")
+    scope = serializers.ChoiceField(
+        choices=["user", "all"],
+        default="user",
+        help_text="Logs of the user, or of all users for staff",
+    )
+
+    def validate_scope(self, value: str) -> str:
+        if value == "all" and not self.context["user"].is_staff:
+            raise PermissionDenied("Only staff can export logs of all users.")
+        return value
+
+
 class ScheduledRewardSerializer(serializers.ModelSerializer):
     @staticmethod
     def validate_amount(value: int) -> int:
@@ -26,27 +55,55 @@ class ScheduledRewardSerializer(serializers.ModelSerializer):
             )
         return value
 
-    def validate(self, attrs: dict) -> dict:
-        # Check if user already requested award today
-        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        end = start + timedelta(days=1)
-        if ScheduledReward.objects.filter(
-            user=self.context["user"],
-            created_at__range=[start, end],
-        ).exists():
-            raise serializers.ValidationError("Award can be requested once per day.")
+    def create_award(self, validated_data: dict) -> ScheduledReward:
+        # Create new award scheduled in 5 minutes, the unique request date
+        # rejects a second request of the user on the same day
+        now = timezone.now()
+        user = self.context["user"]
+        try:
+            with transaction.atomic():
+                award = ScheduledReward.objects.create(
+                    user=user,
+                    amount=validated_data["amount"],
+                    execute_at=now + timedelta(minutes=5),
+                    request_date=now.date(),
+                )
+        except IntegrityError:
+            # Only a reward of the same day violates the unique request date,
+            # other constraint failures are not the client's fault
+            if ScheduledReward.objects.filter(
+                user=user, request_date=now.date()
+            ).exists():
+                raise self.once_per_day_error()
+            raise
 
-        return attrs
+        transaction.on_commit(lambda: user_cache.bump_versions([award.user_id]))
+        if settings.REWARDS_ETA_DISPATCH:
+            transaction.on_commit(lambda: schedule_reward(award))
+        return award
 
-    def create_award(self, validated_data: dict) -> ScheduledReward:
-        # Create new award scheduled in 5 minutes
-        return ScheduledReward.objects.create(
-            user=self.context["user"],
-            amount=validated_data["amount"],
-            execute_at=timezone.now() + timedelta(minutes=5),
+    async def acreate_award(self, validated_data: dict) -> ScheduledReward:
+        # Repeated requests of the day are answered by an index lookup, without
+        # opening a transaction, the unique request date still decides races
+        already_requested = await ScheduledReward.objects.filter(
+            user=self.context["user"], request_date=timezone.now().date()
+        ).aexists()
+        if already_requested:
+            raise self.once_per_day_error()
+        return await sync_to_async(self.create_award)(validated_data)
+
+    @staticmethod
+    def once_per_day_error() -> serializers.ValidationError:
+        return serializers.ValidationError(
+            {
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    "Award can be requested once per day."
+                ]
+            }
         )
 
     class Meta:
         model = ScheduledReward
         fields = ["amount", "execute_at", "is_executed", "created_at"]
         read_only_fields = ["execute_at", "is_executed", "created_at"]
+        extra_kwargs = {"amount": {"required": True}}
@@ -1,9 +1,132 @@
-from celery import shared_task
+import time
+from datetime import timedelta
 
-from django.core.management import call_command
+from celery import group, shared_task
+from celery.signals import task_postrun, task_prerun
 
+from django.conf import settings
+from django.utils import timezone
 
-@shared_task
+from api import leases, maintenance, metrics, next_due, processing
+from api.models import ScheduledReward
+
+# Executing rewards is idempotent, their messages are acknowledged after the
+# run, so the run of a lost worker is delivered again instead of dropped
+REWARD_TASK_OPTIONS = {"acks_late": True, "reject_on_worker_lost": True}
+
+
+@shared_task(**REWARD_TASK_OPTIONS)
 def process_rewards():
     """Process scheduled rewards that are due."""
-    call_command("process_rewards")
+    if settings.REWARDS_PARTITIONS > 1:
+        dispatch_reward_partitions(settings.REWARDS_PARTITIONS)
+        return 0
+
+    now = timezone.now()
+    if settings.REWARDS_DUE_INDEX:
+        return processing.execute_from_index(now, settings.REWARDS_CHUNK_SIZE)
+
+    pending_rewards = ScheduledReward.objects.due(now)
+    if settings.REWARDS_BULK_PROCESSING and settings.REWARDS_SINGLE_FLIGHT:
+        return execute_single_flight(pending_rewards)
+    if settings.REWARDS_BULK_PROCESSING:
+        return processing.execute_bulk(pending_rewards, settings.REWARDS_CHUNK_SIZE)
+    return processing.execute_each(pending_rewards)
+
+
+def execute_single_flight(pending_rewards):
+    """Execute due rewards within the run budget unless another run is active."""
+    with leases.single_flight(
+        process_rewards.name, settings.REWARDS_LEASE_TTL
+    ) as lease:
+        if lease is None:
+            return 0
+        return processing.execute_resumable(
+            pending_rewards,
+            settings.REWARDS_CHUNK_SIZE,
+            settings.REWARDS_RUN_BUDGET,
+            lease,
+        )
+
+
+def dispatch_reward_partitions(count: int):
+    """Fan due rewards out to the workers, one task per user-id hash partition."""
+    return group(
+        process_reward_partition.s(index, count) for index in range(count)
+    ).apply_async()
+
+
+@shared_task(**REWARD_TASK_OPTIONS)
+def process_reward_partition(index: int, count: int):
+    """Process due rewards of one partition, claiming rows with SKIP LOCKED."""
+    pending_rewards = ScheduledReward.objects.due().partition(index, count)
+    return processing.execute_bulk(pending_rewards, settings.REWARDS_CHUNK_SIZE)
+
+
+@shared_task(**REWARD_TASK_OPTIONS)
+def execute_reward(reward_id: int):
+    """Execute a single reward at its scheduled time."""
+    pending_rewards = ScheduledReward.objects.filter(pk=reward_id).due()
+    executed = processing.execute_bulk(pending_rewards, 1)
+    if executed:
+        return executed
+
+    # Delivered ahead of time, e.g. because of a clock skew between nodes
+    reward = ScheduledReward.objects.filter(pk=reward_id, is_executed=False).first()
+    if reward and reward.execute_at > timezone.now():
+        schedule_reward(reward)
+    return 0
+
+
+def schedule_reward(reward: ScheduledReward):
+    """Run the reward exactly at its execution time instead of waiting for a sweep."""
+    return execute_reward.apply_async((reward.id,), eta=reward.execute_at)
+
+
+@shared_task
+def rotate_reward_tables():
+    """Create upcoming reward log partitions and archive old executed rewards."""
+    now = timezone.now()
+    maintenance.rotate_reward_log_partitions(
+        now.date(), settings.REWARD_LOG_PARTITIONS_AHEAD
+    )
+    return maintenance.archive_executed_rewards(
+        now - timedelta(days=settings.REWARDS_ARCHIVE_AFTER_DAYS),
+        settings.REWARDS_ARCHIVE_BATCH_SIZE,
+    )
+
+
+REWARD_TASKS = {
+    process_rewards.name,
+    process_reward_partition.name,
+    execute_reward.name,
+}
+_run_started = {}
+
+
+@task_prerun.connect
+def start_reward_run(task_id, task, **kwargs):
+    if task.name not in REWARD_TASKS:
+        return
+    _run_started[task_id] = time.perf_counter()
+    if task.name == process_rewards.name:
+        metrics.REWARDS_BACKLOG.set(ScheduledReward.objects.due().count())
+
+
+@task_postrun.connect
+def finish_reward_run(task_id, task, retval, **kwargs):
+    started = _run_started.pop(task_id, None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    metrics.REWARD_RUN_DURATION.labels(task.name).observe(duration)
+    if isinstance(retval, int):
+        metrics.REWARDS_PROCESSED.labels(task.name).inc(retval)
+        if retval and duration:
+            metrics.REWARDS_THROUGHPUT.labels(task.name).set(retval / duration)
+
+
+@task_postrun.connect
+def refresh_next_due(task, **kwargs):
+    if settings.REWARDS_NEXT_DUE_HINT and task.name in REWARD_TASKS:
+        next_due.refresh()
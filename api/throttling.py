@@ -0,0 +1,95 @@
+"""
+Token-bucket throttles shared by all workers and nodes through Redis.
+
+Every client has a bucket per scope holding up to `capacity` tokens, refilled
+at `capacity / period` tokens per second. A request takes one token, the check
+and the update run in one Lua script, so concurrent requests never overdraw a
+bucket. Rates are configured per scope in REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]
+in the DRF format, e.g. "10/min".
+"""
+
+import redis
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from api.redis_client import get_redis
+
+BUCKET_KEY = "throttle:{scope}:{ident}"
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# Returns whether a token was taken and the seconds until the next one, the
+# clock of the Redis server is used so the nodes need not agree on the time
+TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """Number of requests and seconds of a DRF rate, e.g. 10/min"""
+    requests, period = rate.split("/")
+    return int(requests), PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope: str
+
+    def __init__(self):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        self.capacity, self.refill_rate = None, None
+        if rate:
+            self.capacity, period = parse_rate(rate)
+            self.refill_rate = self.capacity / period
+        self.retry_after = None
+
+    def get_ident(self, request):
+        # Authenticated clients are limited per user, anonymous ones per address
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def allow_request(self, request, view):
+        if self.capacity is None:
+            return True
+
+        key = BUCKET_KEY.format(scope=self.scope, ident=self.get_ident(request))
+        try:
+            allowed, wait = get_redis().eval(
+                TAKE_TOKEN_SCRIPT, 1, key, self.capacity, self.refill_rate
+            )
+        except redis.RedisError:
+            # Serving without limits beats failing every request
+            return True
+        self.retry_after = float(wait)
+        return bool(allowed)
+
+    def wait(self):
+        return self.retry_after
+
+
+class AwardRequestThrottle(TokenBucketThrottle):
+    scope = "award_request"
+
+
+class TokenObtainThrottle(TokenBucketThrottle):
+    """Guards the PBKDF2 password check, the most expensive request we serve"""
+
+    scope = "token_obtain"
@@ -4,19 +4,36 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import ProfileViewSet, RewardsViewSet
+from .throttling import TokenObtainThrottle
+from .views import (
+    CacheStatsViewSet,
+    ProfileViewSet,
+    RewardLogsViewSet,
+    RewardsViewSet,
+)
+
+if settings.API_ASYNC_VIEWS:
+    from .async_views import AsyncProfileViewSet as ProfileViewSet
+    from .async_views import AsyncRewardsViewSet as RewardsViewSet
 
 router = DefaultRouter()
 router.register("profile", ProfileViewSet, basename="profile")
 router.register("rewards", RewardsViewSet, basename="rewards")
+router.register("reward-logs", RewardLogsViewSet, basename="reward-logs")
+router.register("cache-stats", CacheStatsViewSet, basename="cache-stats")
 
 
 urlpatterns = [
     path("", include(router.urls)),
-    path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path(
+        "token/",
+        TokenObtainPairView.as_view(throttle_classes=[TokenObtainThrottle]),
+        name="token_obtain_pair",
+    ),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
 ]
@@ -0,0 +1,89 @@
+"""
+Per-user cache of serialized API responses.
+
+Every user has a version key, cached payloads are stored under the current
+version. Bumping the version, whenever coins or rewards of the user change,
+invalidates all payloads of the user at once without looking them up.
+"""
+
+import time
+from typing import Awaitable, Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = "user:{user_id}:version"
+PAYLOAD_KEY = "user:{user_id}:{name}:{version}"
+HITS_KEY = "response_cache:hits"
+MISSES_KEY = "response_cache:misses"
+
+
+def get_version(user_id: int) -> int:
+    # Versions are timestamps, so a version key lost by eviction never comes
+    # back with the value of an outdated payload
+    return cache.get_or_set(
+        VERSION_KEY.format(user_id=user_id), time.time_ns, timeout=None
+    )
+
+
+def bump_versions(user_ids: Iterable[int]) -> None:
+    version = time.time_ns()
+    cache.set_many(
+        {VERSION_KEY.format(user_id=user_id): version for user_id in user_ids},
+        timeout=None,
+    )
+
+
+def get_payload(user_id: int, name: str, build: Callable, version: int = None):
+    """Return the cached payload `name` of the user, build and cache it on a miss"""
+    if version is None:
+        version = get_version(user_id)
+    key = PAYLOAD_KEY.format(user_id=user_id, name=name, version=version)
+    payload = cache.get(key)
+    if payload is not None:
+        _count(HITS_KEY)
+        return payload
+
+    _count(MISSES_KEY)
+    payload = build()
+    cache.set(key, payload, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_version(user_id: int) -> int:
+    return await cache.aget_or_set(
+        VERSION_KEY.format(user_id=user_id), time.time_ns, timeout=None
+    )
+
+
+async def aget_payload(
+    user_id: int, name: str, build: Callable[[], Awaitable], version: int = None
+):
+    """Async `get_payload`, `build` is a coroutine function"""
+    if version is None:
+        version = await aget_version(user_id)
+    key = PAYLOAD_KEY.format(user_id=user_id, name=name, version=version)
+    payload = await cache.aget(key)
+    if payload is not None:
+        await _acount(HITS_KEY)
+        return payload
+
+    await _acount(MISSES_KEY)
+    payload = await build()
+    await cache.aset(key, payload, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    return payload
+
+
+def get_stats() -> dict:
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": stats.get(HITS_KEY, 0), "misses": stats.get(MISSES_KEY, 0)}
+
+
+def _count(key: str) -> None:
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+async def _acount(key: str) -> None:
+    await cache.aadd(key, 0, timeout=None)
+    await cache.aincr(key)
@@ -1,32 +1,109 @@
+import hashlib
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
-from api.models import ScheduledReward
-from api.serializers import ScheduledRewardSerializer, UserSerializer
+from api import exports, idempotency, user_cache
+from api.fast_serializers import get_row_serializer
+from api.models import RewardLog, ScheduledReward
+from api.pagination import RewardsCursorPagination
+from api.renderers import CSVExportRenderer, NDJSONExportRenderer, ORJSONRenderer
+from api.serializers import (
+    CacheStatsSerializer,
+    RewardLogExportSerializer,
+    ScheduledRewardSerializer,
+    UserSerializer,
+)
+from api.throttling import AwardRequestThrottle
+
+# Views without float fields, rendered byte for byte as by the DRF renderer
+FAST_RENDERER_CLASSES = (ORJSONRenderer, BrowsableAPIRenderer)
 
 
-class ProfileViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class ProfileViewMixin:
     serializer_class = UserSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get_profile(self):
+        row_serializer = get_row_serializer(self.get_serializer_class())
+        return row_serializer.from_instance(self.request.user)
+
 
+class ProfileViewSet(ProfileViewMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     def list(self, request, *args, **kwargs):
-        serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        data = user_cache.get_payload(request.user.id, "profile", self.get_profile)
+        return Response(data)
 
 
-class RewardsViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class RewardsViewMixin:
     queryset = ScheduledReward.objects.all()
     serializer_class = ScheduledRewardSerializer
+    pagination_class = RewardsCursorPagination
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get_queryset(self):
         return ScheduledReward.objects.filter(user=self.request.user)
 
+    def get_validators(self, request, version: int) -> tuple[str, str, int]:
+        """Page key, ETag and Last-Modified time of the requested rewards page"""
+        # The cache version changes with every change of the user's rewards,
+        # unchanged pages are answered with 304 before anything is serialized
+        page_key = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        etag = quote_etag(f"{version:x}-{page_key[:12]}")
+        return page_key, etag, version // 10**9
+
+    @staticmethod
+    def set_validators(response, etag: str, last_modified: int):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def get_page(self):
+        # Rows are read as dicts, the cursor position is taken from them too
+        row_serializer = get_row_serializer(self.get_serializer_class())
+        ordering = (field.lstrip("-") for field in self.paginator.ordering)
+        rows = self.get_queryset().values(
+            *dict.fromkeys((*row_serializer.sources, *ordering))
+        )
+        page = self.paginate_queryset(rows)
+        data = row_serializer.to_representation_many(page)
+        return self.get_paginated_response(data).data
+
+
+class RewardsViewSet(RewardsViewMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     def list(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
+        version = user_cache.get_version(request.user.id)
+        page_key, etag, last_modified = self.get_validators(request, version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(
+                user_cache.get_payload(
+                    request.user.id, f"rewards:{page_key}", self.get_page, version
+                )
+            )
+        return self.set_validators(response, etag, last_modified)
 
-    @action(detail=False, methods=["post"], url_path="request")
+    @extend_schema(parameters=[idempotency.SCHEMA_PARAMETER])
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="request",
+        throttle_classes=[AwardRequestThrottle],
+    )
     def award_request(self, request, *args, **kwargs):
+        return idempotency.run(self, request, self.request_award)
+
+    def request_award(self, request):
         serializer = self.get_serializer(
             data=request.data, context={"user": request.user}
         )
@@ -34,3 +111,52 @@ class RewardsViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         award = serializer.create_award(serializer.validated_data)
         serializer = self.get_serializer(award)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class RewardLogsViewSet(viewsets.GenericViewSet):
+    serializer_class = RewardLogExportSerializer
+
+    @extend_schema(
+        parameters=[RewardLogExportSerializer],
+        responses={
+            (200, content_type): OpenApiTypes.STR
+            for content_type in exports.CONTENT_TYPES.values()
+        },
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[CSVExportRenderer, NDJSONExportRenderer],
+    )
+    def export(self, request, *args, **kwargs):
+        # The output parameter wins over the format negotiated by Accept
+        params = request.query_params.copy()
+        params.setdefault("output", request.accepted_renderer.format)
+        serializer = self.get_serializer(data=params, context={"user": request.user})
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        reward_logs = RewardLog.objects.all()
+        if params["scope"] == "user":
+            reward_logs = reward_logs.filter(user=request.user)
+        reward_logs = exports.filter_reward_logs(
+            reward_logs, params.get("start"), params.get("end")
+        )
+
+        response = StreamingHttpResponse(
+            exports.export(reward_logs, params["output"]),
+            content_type=exports.CONTENT_TYPES[params["output"]],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="reward_logs.{params["output"]}"'
+        )
+        return response
+
+
+class CacheStatsViewSet(viewsets.GenericViewSet):
+    serializer_class = CacheStatsSerializer
+    permission_classes = [IsAdminUser]
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(user_cache.get_stats())
+        return Response(serializer.data)
@@ -1,9 +1,30 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_case.settings")
 
 app = Celery("api_case")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """Serve reward pipeline metrics of all pool processes of the worker"""
+    port = os.environ.get("CELERY_METRICS_PORT")
+    if port:
+        from prometheus_client import start_http_server
+
+        from api.metrics import get_registry
+
+        start_http_server(int(port), registry=get_registry())
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid, **kwargs):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
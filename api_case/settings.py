@@ -13,6 +13,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    # collectstatic writes one content-hashed copy of each asset with gzip and
+    # brotli variants, WhiteNoise serves the hashed names as immutable
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    },
+}
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -63,6 +72,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "api.middleware.MetricsMiddleware",
+    "api.middleware.ReplicaMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -107,6 +118,17 @@ DATABASES = {
         },
     }
 }
+if os.environ.get("MARIADB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.environ["MARIADB_REPLICA_HOST"],
+        "PORT": os.environ.get("MARIADB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["api.replicas.ReplicaRouter"]
+# Seconds a client reads from the primary after a write, longer than the
+# replication lag
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
 
 
 # Password validation
@@ -171,13 +193,28 @@ SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = "DENY"
 
+# Metrics, when set the /metrics endpoint requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
 # Celery Configuration
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = os.environ.get("REDIS_PORT", 6379)
 REDIS_DB = os.environ.get("REDIS_DB", 0)
 
-CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
-CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
+REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
+
+# Cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 5 * 60))
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get("AUTH_USER_CACHE_TIMEOUT", 60))
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
@@ -185,18 +222,87 @@ CELERY_TIMEZONE = "UTC"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# Reward tasks run on their own queue, so that workers consuming it are not
+# blocked by other tasks. Each process reserves one task at a time.
+REWARDS_QUEUE = os.environ.get("REWARDS_QUEUE", "rewards")
+CELERY_TASK_ROUTES = {
+    "api.tasks.process_rewards": {"queue": REWARDS_QUEUE},
+    "api.tasks.process_reward_partition": {"queue": REWARDS_QUEUE},
+    "api.tasks.execute_reward": {"queue": REWARDS_QUEUE},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(
+    os.environ.get("CELERY_WORKER_PREFETCH_MULTIPLIER", 1)
+)
+# Used by workers started with --autoscale=MAX,MIN
+CELERY_WORKER_AUTOSCALER = "api.autoscale:BacklogAutoscaler"
+REWARDS_AUTOSCALE_INTERVAL = int(os.environ.get("REWARDS_AUTOSCALE_INTERVAL", 10))
+
+# Rewards processing
+REWARDS_BULK_PROCESSING = os.environ.get("REWARDS_BULK_PROCESSING", "1") == "1"
+REWARDS_CHUNK_SIZE = int(os.environ.get("REWARDS_CHUNK_SIZE", 1000))
+REWARDS_PARTITIONS = int(os.environ.get("REWARDS_PARTITIONS", 1))
+# Schedule every new reward as a Celery task with eta=execute_at, the periodic
+# sweep then only picks up rewards whose messages were lost
+REWARDS_ETA_DISPATCH = os.environ.get("REWARDS_ETA_DISPATCH", "0") == "1"
+REWARDS_SWEEP_MINUTE = os.environ.get(
+    "REWARDS_SWEEP_MINUTE", "*/15" if REWARDS_ETA_DISPATCH else "*"
+)
+# Keep ids of pending rewards in a Redis sorted set scored by execution time,
+# the processor then pops due ids instead of scanning the rewards table
+REWARDS_DUE_INDEX = os.environ.get("REWARDS_DUE_INDEX", "0") == "1"
+# Keep the earliest pending execution time in Redis, beat then skips sweeps
+# while nothing is due and triggers one as soon as a reward becomes due
+REWARDS_NEXT_DUE_HINT = os.environ.get("REWARDS_NEXT_DUE_HINT", "0") == "1"
+REWARDS_NEXT_DUE_MAX_AGE = int(os.environ.get("REWARDS_NEXT_DUE_MAX_AGE", 60 * 60))
+if REWARDS_NEXT_DUE_HINT:
+    CELERY_BEAT_SCHEDULER = "api.beat:RewardsScheduler"
+# Let only one bulk sweep run at a time, holding a Redis lease renewed after
+# every chunk, and stop it after a time budget. The next run resumes from the
+# checkpoint of the previous one.
+REWARDS_SINGLE_FLIGHT = os.environ.get("REWARDS_SINGLE_FLIGHT", "0") == "1"
+REWARDS_LEASE_TTL = int(os.environ.get("REWARDS_LEASE_TTL", 60))
+REWARDS_RUN_BUDGET = int(os.environ.get("REWARDS_RUN_BUDGET", 5 * 60))
+# Executed rewards older than this are moved to the archive table daily
+REWARDS_ARCHIVE_AFTER_DAYS = int(os.environ.get("REWARDS_ARCHIVE_AFTER_DAYS", 30))
+REWARDS_ARCHIVE_BATCH_SIZE = int(os.environ.get("REWARDS_ARCHIVE_BATCH_SIZE", 5000))
+# Monthly partitions of the reward log created in advance (MariaDB only)
+REWARD_LOG_PARTITIONS_AHEAD = int(os.environ.get("REWARD_LOG_PARTITIONS_AHEAD", 2))
 
 # REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # Token buckets in Redis, see api.throttling, requests per user or address
+    "DEFAULT_THROTTLE_RATES": {
+        "award_request": os.environ.get("THROTTLE_AWARD_REQUEST", "10/min"),
+        "token_obtain": os.environ.get("THROTTLE_TOKEN_OBTAIN", "5/min"),
+    },
+    # Clients set X-Forwarded-For at will, only the hops added by our own
+    # proxies are trusted. With 0 the address is the socket peer, REMOTE_ADDR
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
 }
 
+# wsgi: sync gunicorn workers, asgi: uvicorn workers serving the async views
+API_SERVER = os.environ.get("API_SERVER", "wsgi")
+API_ASYNC_VIEWS = API_SERVER == "asgi"
+
+# Responses of requests with an Idempotency-Key header are replayed for a day,
+# duplicates arriving meanwhile wait for the first response up to the lock timeout
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 10))
+
+REWARDS_PAGE_SIZE = int(os.environ.get("REWARDS_PAGE_SIZE", 50))
+REWARDS_MAX_PAGE_SIZE = int(os.environ.get("REWARDS_MAX_PAGE_SIZE", 200))
+
+# Pre-generated OpenAPI schema, built by the build_schema command
+SCHEMA_ROOT = os.environ.get("SCHEMA_ROOT", BASE_DIR / "schema")
+SCHEMA_MAX_AGE = int(os.environ.get("SCHEMA_MAX_AGE", 24 * 60 * 60))
+
 # Spectacular settings
 SPECTACULAR_SETTINGS = {
     "TITLE": "API Demo",
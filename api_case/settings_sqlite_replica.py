@@ -0,0 +1,22 @@
+"""
+Settings for running the API and the tests locally without MariaDB and Redis.
+
+Two SQLite databases stand in for the primary and the read replica. They are not
+replicated, so data written to the primary is visible on the replica only when
+written there as well, which makes misrouted reads easy to spot.
+"""
+
+from api_case.settings import *  # noqa: F401,F403
+from api_case.settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "primary.sqlite3",
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "replica.sqlite3",
+    },
+}
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
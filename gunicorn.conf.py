@@ -0,0 +1,9 @@
+import os
+
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drop live gauges of the worker from the aggregated metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
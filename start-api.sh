@@ -2,14 +2,32 @@
 
 set -e
 
-echo "Collecting static files..."
-python manage.py collectstatic --no-input
+# Static files and the schema are built with the image, migrations are applied
+# by the release. Fix them here only outside of strict mode, e.g. with a
+# mounted tree.
+echo "Checking static files manifest, schema and migrations..."
+if [ "${STARTUP_STRICT:-0}" = "1" ]; then
+    python manage.py check_startup
+else
+    python manage.py check_startup --fix
+fi
 
-echo "Applying database migrations..."
-python manage.py migrate --no-input
+echo "Preparing metrics directory..."
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+if [ "${API_SERVER:-wsgi}" = "asgi" ]; then
+    echo "Starting Django server by Gunicorn with Uvicorn workers..."
+    exec gunicorn api_case.asgi:application \
+        --worker-class uvicorn_worker.UvicornWorker \
+        --timeout 60 \
+        --workers "${API_WORKERS:-3}" \
+        --bind 0.0.0.0:8000
+fi
 
 echo "Starting Django server by Gunicorn..."
-gunicorn api_case.wsgi:application \
+exec gunicorn api_case.wsgi:application \
     --timeout 60 \
-    --workers 3 \
+    --workers "${API_WORKERS:-3}" \
     --bind 0.0.0.0:8000
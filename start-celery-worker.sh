@@ -2,5 +2,13 @@
 
 set -e
 
+echo "Preparing metrics directory..."
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+export CELERY_METRICS_PORT=${CELERY_METRICS_PORT:-9808}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 echo "Starting Celery worker..."
-celery -A api_case worker --loglevel=info
+celery -A api_case worker --loglevel=info \
+    --queues "${CELERY_WORKER_QUEUES:-celery,rewards}" \
+    ${CELERY_WORKER_AUTOSCALE:+--autoscale "$CELERY_WORKER_AUTOSCALE"}
@@ -1,3 +0,0 @@
-$(document).ready(function() {
-  $('form').ajaxForm();
-});
@@ -0,0 +1,14 @@
+"""
+Routes of the API with API_ASYNC_VIEWS, whose viewsets are chosen at import.
+"""
+
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from api.async_views import AsyncProfileViewSet, AsyncRewardsViewSet
+
+router = DefaultRouter()
+router.register("profile", AsyncProfileViewSet, basename="profile")
+router.register("rewards", AsyncRewardsViewSet, basename="rewards")
+
+urlpatterns = [path("api/", include(router.urls))]
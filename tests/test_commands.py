@@ -1,12 +1,29 @@
+import asyncio
+import json
+import tempfile
 from datetime import timedelta
 from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+import fakeredis
+import httpx
 
 from django.contrib.auth import get_user_model
-from django.core.management import call_command
-from django.test import TestCase
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from rest_framework.test import APIClient
 
-from api.models import RewardLog, ScheduledReward
+from api import due_index
+from api.benchmarks import run_load
+from api.maintenance import archive_executed_rewards
+from api.models import RewardLog, ScheduledReward, ScheduledRewardArchive
+from api.tasks import process_rewards
 
 User = get_user_model()
 
@@ -81,3 +98,545 @@ class ProcessRewardsCommandTest(TestCase):
 
         # Verify no additional reward logs were created
         self.assertEqual(RewardLog.objects.count(), 1)
+
+    def test_execute_stale_instance(self):
+        """Test that a reward loaded before its execution is not executed again"""
+        stale_reward = ScheduledReward.objects.get(pk=self.due_reward.pk)
+        self.assertTrue(self.due_reward.execute())
+        self.assertFalse(stale_reward.execute())
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 100)
+        self.assertEqual(RewardLog.objects.count(), 1)
+
+    def test_execute_keeps_other_columns(self):
+        """Test that executing increments coins without rewriting the user row"""
+        User.objects.filter(pk=self.user.pk).update(coins=5, first_name="Changed")
+        self.due_reward.execute()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 105)
+        self.assertEqual(self.user.first_name, "Changed")
+
+
+class ProcessRewardsBulkCommandTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create(username=f"test_user_{i}", password="test_password")
+            for i in range(3)
+        ]
+        now = timezone.now()
+        for minutes in range(1, 6):
+            for user in self.users:
+                ScheduledReward.objects.create(
+                    user=user,
+                    amount=minutes * 10,
+                    execute_at=now - timedelta(minutes=minutes),
+                )
+        ScheduledReward.objects.create(
+            user=self.users[0], amount=500, execute_at=now + timedelta(minutes=5)
+        )
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("process_rewards", *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by("pk").values_list("coins", flat=True)),
+            sorted(RewardLog.objects.values_list("user_id", "amount", "reason")),
+            sorted(
+                ScheduledReward.objects.values_list("pk", "is_executed"),
+            ),
+        )
+
+    def test_bulk_matches_per_row_processing(self):
+        """Test that bulk mode gives the same balances, logs and output"""
+        sid = transaction.savepoint()
+        per_row_output = self.run_command()
+        per_row_state = self.snapshot()
+        transaction.savepoint_rollback(sid)
+
+        bulk_output = self.run_command("--bulk", "--chunk-size", "4")
+
+        self.assertEqual(self.snapshot(), per_row_state)
+        self.assertEqual(bulk_output, per_row_output)
+        self.assertIn("Successfully processed 15 rewards", bulk_output)
+
+    def test_bulk_query_count_per_chunk(self):
+        """Test that bulk mode costs a constant number of queries per chunk"""
+        with CaptureQueriesContext(connection) as context:
+            self.run_command("--bulk", "--chunk-size", "4")
+        queries = [
+            query
+            for query in context.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        # 4 chunks of 5 queries, plus the empty chunk that ends the run
+        self.assertEqual(len(queries), 4 * 5 + 1)
+
+
+@override_settings(REWARDS_DUE_INDEX=True)
+class DueIndexCommandsTest(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch("api.due_index.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create(username="test_user", password="test_password")
+        now = timezone.now()
+        self.due_reward = ScheduledReward.objects.create(
+            user=self.user, amount=100, execute_at=now - timedelta(minutes=5)
+        )
+        self.future_reward = ScheduledReward.objects.create(
+            user=self.user, amount=200, execute_at=now + timedelta(minutes=5)
+        )
+        self.executed_reward = ScheduledReward.objects.create(
+            user=self.user,
+            amount=300,
+            execute_at=now - timedelta(minutes=10),
+            is_executed=True,
+        )
+
+    def indexed_ids(self):
+        return {int(pk) for pk in self.redis.zrange(due_index.INDEX_KEY, 0, -1)}
+
+    def test_rebuild_due_index(self):
+        """Test that the index is repopulated with pending rewards only"""
+        self.redis.zadd(due_index.INDEX_KEY, {self.executed_reward.id: 0})
+
+        out = StringIO()
+        call_command("rebuild_due_index", stdout=out)
+
+        self.assertIn(
+            "Indexed 2 pending rewards, removed 1 stale entries", out.getvalue()
+        )
+        self.assertEqual(
+            self.indexed_ids(), {self.due_reward.id, self.future_reward.id}
+        )
+
+    def test_process_rewards_from_index(self):
+        """Test that the processor executes due rewards popped from the index"""
+        call_command("rebuild_due_index", stdout=StringIO())
+
+        out = StringIO()
+        call_command("process_rewards", "--from-index", stdout=out)
+
+        self.assertIn("Successfully processed 1 rewards", out.getvalue())
+        self.assertIn(f"Processed reward: {self.due_reward}", out.getvalue())
+        self.assertEqual(self.indexed_ids(), {self.future_reward.id})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 100)
+
+    def test_orm_created_reward_is_indexed(self):
+        """Test that rewards saved outside of the API are processed in index mode"""
+        with self.captureOnCommitCallbacks(execute=True):
+            reward = ScheduledReward.objects.create(
+                user=self.user, amount=50, execute_at=timezone.now()
+            )
+        self.assertIn(reward.id, self.indexed_ids())
+
+        process_rewards()
+
+        reward.refresh_from_db()
+        self.assertTrue(reward.is_executed)
+        self.assertNotIn(reward.id, self.indexed_ids())
+
+    def test_changed_reward_updates_index(self):
+        """Test that saving and deleting rewards updates their index entries"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.due_reward.save()
+        later = timezone.now() + timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.due_reward.execute_at = later
+            self.due_reward.save()
+        self.assertEqual(
+            self.redis.zscore(due_index.INDEX_KEY, self.due_reward.id),
+            later.timestamp(),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.due_reward.delete()
+        self.assertNotIn(self.due_reward.id, self.indexed_ids())
+
+    def test_moved_reward_returns_to_index(self):
+        """Test that popped ids of rewards that are not due yet are put back"""
+        self.redis.zadd(due_index.INDEX_KEY, {self.future_reward.id: 0})
+
+        call_command("process_rewards", "--from-index", stdout=StringIO())
+
+        self.future_reward.refresh_from_db()
+        self.assertFalse(self.future_reward.is_executed)
+        self.assertEqual(
+            self.redis.zscore(due_index.INDEX_KEY, self.future_reward.id),
+            self.future_reward.execute_at.timestamp(),
+        )
+
+    def test_executed_reward_leaves_index(self):
+        """Test that rewards executed outside of the index are removed from it"""
+        call_command("rebuild_due_index", stdout=StringIO())
+
+        self.due_reward.execute()
+
+        self.assertEqual(self.indexed_ids(), {self.future_reward.id})
+
+
+class BenchmarkQueriesCommandTest(TransactionTestCase):
+    def test_benchmark_queries(self):
+        """Test that the benchmark seeds data and reports every hot query"""
+        out = StringIO()
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark_queries",
+                seed_users=5,
+                seed_rewards=50,
+                repeat=1,
+                compare_without_indexes=True,
+                allow_dropping_indexes=True,
+                output=output.name,
+                stdout=out,
+            )
+            results = json.load(output)
+
+        self.assertEqual(results["rewards"], 50)
+        self.assertEqual(set(results["with_indexes"]), set(results["without_indexes"]))
+        self.assertIn("pending_rewards_chunk", results["with_indexes"])
+
+        # Indexes are recreated after the comparison
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, ScheduledReward._meta.db_table
+            )
+        self.assertIn("reward_pending_idx", constraints)
+        # Seeded data is deleted after the run
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(ScheduledReward.objects.exists())
+
+    def test_keep_data(self):
+        """Test that seeded data is kept on request"""
+        call_command(
+            "benchmark_queries",
+            seed_users=2,
+            seed_rewards=10,
+            repeat=1,
+            keep_data=True,
+            stdout=StringIO(),
+        )
+        self.assertEqual(ScheduledReward.objects.count(), 10)
+
+    def test_dropping_indexes_needs_confirmation(self):
+        """Test that indexes are not dropped without the explicit flag"""
+        with self.assertRaisesMessage(CommandError, "--allow-dropping-indexes"):
+            call_command(
+                "benchmark_queries", compare_without_indexes=True, stdout=StringIO()
+            )
+
+
+class BenchRewardsCommandTest(TestCase):
+    def run_bench(self, *args):
+        out = StringIO()
+        call_command(
+            "bench_rewards", "--users", "5", "--rewards", "40", *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_bench_rewards(self):
+        """Test that the benchmark processes seeded rewards and cleans up"""
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            self.run_bench("--bulk", "--chunk-size", "10", "--output", output.name)
+            results = json.load(output)
+
+        self.assertEqual(results["processed"], 40)
+        # 4 chunks of 5 queries and the empty chunk, each wrapped in a savepoint
+        # inside of the test transaction
+        self.assertEqual(results["queries"], 4 * (5 + 2) + (1 + 2))
+        self.assertGreater(results["rows_per_sec"], 0)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(ScheduledReward.objects.exists())
+
+    def test_bench_rewards_leaves_other_rewards(self):
+        """Test that the benchmark executes only the rewards it seeded"""
+        user = User.objects.create(username="real_user", password="test_password")
+        reward = ScheduledReward.objects.create(
+            user=user, amount=10, execute_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        self.run_bench("--bulk")
+
+        reward.refresh_from_db()
+        self.assertFalse(reward.is_executed)
+        self.assertFalse(RewardLog.objects.exists())
+
+    def test_bench_rewards_regression(self):
+        """Test that a regression against the baseline fails the run"""
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as baseline:
+            json.dump({"queries": 1, "rows_per_sec": 10**9}, baseline)
+            baseline.flush()
+            with self.assertRaisesMessage(CommandError, "queries, rows_per_sec"):
+                self.run_bench("--baseline", baseline.name)
+
+    def test_bench_rewards_no_regression(self):
+        """Test that results within the threshold pass the comparison"""
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as baseline:
+            json.dump({"queries": 10**6, "rows_per_sec": 1}, baseline)
+            baseline.flush()
+            output = self.run_bench("--baseline", baseline.name)
+        self.assertNotIn("REGRESSION", output)
+
+
+class BenchServersLoadTest(TestCase):
+    def test_run_load(self):
+        """Test that the load generator sends all requests and counts errors"""
+        statuses = iter([500] + [200] * 19)
+        transport = httpx.MockTransport(lambda request: httpx.Response(next(statuses)))
+        results = asyncio.run(
+            run_load("http://testserver/api/profile/", 20, 4, transport=transport)
+        )
+        self.assertEqual(results["requests"], 20)
+        self.assertEqual(results["errors"], 1)
+        self.assertLessEqual(results["p50_ms"], results["p99_ms"])
+
+
+class BenchSerializersCommandTest(TestCase):
+    def test_bench_serializers(self):
+        """Test that both serialization paths are timed and seeded data is deleted"""
+        out = StringIO()
+        call_command("bench_serializers", "--rows", "10", "--repeat", "1", stdout=out)
+        self.assertIn("speedup", out.getvalue())
+        self.assertFalse(User.objects.exists())
+
+
+class ExportRewardLogsCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user", password="test_password")
+        RewardLog.objects.bulk_create(
+            RewardLog(user=self.user, amount=amount) for amount in range(1, 6)
+        )
+        # Equal timestamps must not break the keyset pagination of the export
+        RewardLog.objects.update(given_at=timezone.now())
+
+    def test_export_reward_logs(self):
+        """Test that all logs are exported in chunks without duplicates"""
+        out = StringIO()
+        call_command(
+            "export_reward_logs",
+            "--output-format",
+            "ndjson",
+            "--chunk-size",
+            "2",
+            "--user",
+            "test_user",
+            stdout=out,
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(sorted(row["amount"] for row in rows), [1, 2, 3, 4, 5])
+
+    def test_export_reward_logs_to_file(self):
+        """Test that logs are exported as CSV to a file"""
+        with tempfile.NamedTemporaryFile(suffix=".csv") as output:
+            call_command(
+                "export_reward_logs", "--file", output.name, "--start", "2000-01-01"
+            )
+            lines = output.read().decode().splitlines()
+        self.assertEqual(len(lines), 6)
+
+
+class RotateRewardTablesCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user", password="test_password")
+        now = timezone.now()
+        ScheduledReward.objects.bulk_create(
+            [
+                ScheduledReward(
+                    user=self.user,
+                    amount=amount,
+                    execute_at=now - timedelta(days=40),
+                    is_executed=True,
+                )
+                for amount in range(1, 6)
+            ]
+            + [
+                ScheduledReward(
+                    user=self.user,
+                    amount=10,
+                    execute_at=now - timedelta(days=40),
+                ),
+                ScheduledReward(
+                    user=self.user,
+                    amount=20,
+                    execute_at=now - timedelta(days=1),
+                    is_executed=True,
+                ),
+            ]
+        )
+
+    def test_rotate_reward_tables(self):
+        """Test that only old executed rewards are moved to the archive in batches"""
+        out = StringIO()
+        call_command(
+            "rotate_reward_tables",
+            "--archive-after-days",
+            "30",
+            "--batch-size",
+            "2",
+            stdout=out,
+        )
+        self.assertIn("Archived 5 rewards", out.getvalue())
+        self.assertEqual(
+            sorted(ScheduledRewardArchive.objects.values_list("amount", flat=True)),
+            [1, 2, 3, 4, 5],
+        )
+        self.assertEqual(
+            sorted(ScheduledReward.objects.values_list("amount", flat=True)), [10, 20]
+        )
+
+    def test_archiving_invalidates_rewards_list(self):
+        """Test that archived rewards leave the cached list with a new ETag"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        etag = client.get("/api/rewards/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                archive_executed_rewards(timezone.now() - timedelta(days=30), 10)
+
+        # The batch is deleted by key, without selecting it again for signals
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertEqual(statements.count("SELECT"), 2)
+        self.assertEqual(statements.count("DELETE"), 1)
+
+        response = client.get("/api/rewards/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(reward["amount"] for reward in response.json()["results"]),
+            [10, 20],
+        )
+
+    def test_rotate_reward_tables_max_batches(self):
+        """Test that archival stops after the given number of batches"""
+        call_command(
+            "rotate_reward_tables",
+            "--batch-size",
+            "2",
+            "--max-batches",
+            "1",
+            stdout=StringIO(),
+        )
+        self.assertEqual(ScheduledRewardArchive.objects.count(), 2)
+
+
+class ReconcileCoinsCommandTest(TestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create(
+            User(username=f"user_{index}", coins=10) for index in range(5)
+        )
+        RewardLog.objects.bulk_create(
+            RewardLog(user=user, amount=10) for user in self.users
+        )
+        # Drift of two users
+        User.objects.filter(pk=self.users[1].pk).update(coins=15)
+        RewardLog.objects.create(user=self.users[3], amount=7)
+
+    def test_reconcile_coins(self):
+        """Test that drifted users are reported with one query per chunk"""
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("reconcile_coins", "--chunk-size", "2", stdout=out)
+
+        self.assertEqual(len(queries), 4)  # 3 chunks and the empty one
+        self.assertIn(
+            f"User {self.users[1].pk}: coins 15, reward logs 10", out.getvalue()
+        )
+        self.assertIn(
+            f"User {self.users[3].pk}: coins 10, reward logs 17", out.getvalue()
+        )
+        self.assertIn("Checked 5 users, 2 drifted, 0 repaired", out.getvalue())
+        self.assertEqual(User.objects.get(pk=self.users[1].pk).coins, 15)
+
+    def test_reconcile_coins_repair(self):
+        """Test that coins of drifted users are set to their reward log totals"""
+        out = StringIO()
+        call_command("reconcile_coins", "--repair", stdout=out)
+
+        self.assertIn("Checked 5 users, 2 drifted, 2 repaired", out.getvalue())
+        self.assertEqual(
+            list(User.objects.order_by("pk").values_list("coins", flat=True)),
+            [10, 10, 10, 17, 10],
+        )
+
+
+class CheckStartupCommandTest(TestCase):
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        self.static_root = Path(static_root.name)
+        schema_root = tempfile.TemporaryDirectory()
+        self.addCleanup(schema_root.cleanup)
+        self.schema_root = Path(schema_root.name)
+        override = override_settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[],
+            SCHEMA_ROOT=self.schema_root,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_missing_manifest(self):
+        """Test that startup fails without the static files of the build"""
+        with self.assertRaisesMessage(CommandError, "Missing static files manifest"):
+            call_command("check_startup", stdout=StringIO())
+
+    def test_fix_collects_single_hashed_copies(self):
+        """Test that the fix collects one hashed, compressed copy of each asset"""
+        (self.static_root / "admin").mkdir()
+        (self.static_root / "admin" / "stale.css").write_text("")
+        out = StringIO()
+        call_command("check_startup", "--fix", stdout=out)
+
+        self.assertIn("running collectstatic", out.getvalue())
+        hashed_name = staticfiles_storage.stored_name("admin/css/base.css")
+        self.assertRegex(hashed_name, r"^admin/css/base\.[0-9a-f]{12}\.css$")
+        self.assertTrue((self.static_root / f"{hashed_name}.gz").exists())
+        self.assertFalse((self.static_root / "admin" / "css" / "base.css").exists())
+        self.assertFalse((self.static_root / "admin" / "stale.css").exists())
+
+        (self.static_root / hashed_name).unlink()
+        with self.assertRaisesMessage(CommandError, "1 static files"):
+            call_command("check_startup", stdout=StringIO())
+
+    @patch.object(MigrationExecutor, "migration_plan", return_value=[])
+    def test_fix_builds_schema(self, migration_plan):
+        """Test that a missing pre-generated schema is built only with the fix"""
+        with patch.object(staticfiles_storage, "exists", return_value=True):
+            with patch.object(staticfiles_storage, "load_manifest") as load_manifest:
+                load_manifest.return_value = ({}, "")
+                with self.assertRaisesMessage(CommandError, "schema.yaml"):
+                    call_command("check_startup", stdout=StringIO())
+
+                out = StringIO()
+                call_command("check_startup", "--fix", stdout=out)
+
+        self.assertIn("running build_schema", out.getvalue())
+        self.assertEqual(
+            sorted(path.name for path in self.schema_root.iterdir()),
+            ["schema.json", "schema.json.gz", "schema.yaml", "schema.yaml.gz"],
+        )
+
+    @patch("api.management.commands.check_startup.call_command")
+    @patch.object(MigrationExecutor, "migration_plan", return_value=[None, None])
+    def test_unapplied_migrations(self, migration_plan, call_command_mock):
+        """Test that pending migrations fail the start unless fixing is allowed"""
+        call_command("build_schema", stdout=StringIO())
+        with patch.object(staticfiles_storage, "exists", return_value=True):
+            with patch.object(staticfiles_storage, "load_manifest") as load_manifest:
+                load_manifest.return_value = ({}, "")
+                with self.assertRaisesMessage(CommandError, "2 unapplied migrations"):
+                    call_command("check_startup", stdout=StringIO())
+
+                call_command("check_startup", "--fix", stdout=StringIO())
+
+        call_command_mock.assert_called_once_with(
+            "migrate", interactive=False, verbosity=0
+        )
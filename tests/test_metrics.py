@@ -0,0 +1,201 @@
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction
+from prometheus_client import REGISTRY
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.middleware import MetricsMiddleware, ReplicaMiddleware
+from api.models import RewardLog, ScheduledReward
+from api.tasks import process_rewards
+
+User = get_user_model()
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(
+            username="test_user",
+            password="test_password",
+        )
+        self.client.force_authenticate(user=self.user)
+
+    @staticmethod
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_metrics(self):
+        """Test that latency, queries and size are recorded per view"""
+        count = self.sample(
+            "api_request_duration_seconds_count", view="rewards-list", method="GET"
+        )
+        requests = self.sample(
+            "api_requests_total", view="rewards-list", method="GET", status="200"
+        )
+        queries = self.sample("api_request_db_queries_sum", view="rewards-list")
+
+        self.client.get("/api/rewards/")
+
+        self.assertEqual(
+            self.sample(
+                "api_request_duration_seconds_count", view="rewards-list", method="GET"
+            ),
+            count + 1,
+        )
+        self.assertEqual(
+            self.sample(
+                "api_requests_total", view="rewards-list", method="GET", status="200"
+            ),
+            requests + 1,
+        )
+        self.assertGreater(
+            self.sample("api_request_db_queries_sum", view="rewards-list"), queries
+        )
+        self.assertGreater(
+            self.sample("api_response_size_bytes_sum", view="rewards-list"), 0
+        )
+
+    def test_metrics_endpoint(self):
+        """Test that metrics are exposed in the Prometheus text format"""
+        self.client.get("/api/profile/")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            'api_request_duration_seconds_count{method="GET",view="profile-list"}',
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_endpoint_token(self):
+        """Test that the metrics token is required when configured"""
+        self.assertEqual(
+            self.client.get("/metrics").status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_streamed_export_metrics(self):
+        """Test that queries run while the export is streamed are measured"""
+        RewardLog.objects.create(user=self.user, amount=10, reason="test")
+        labels = {"view": "reward-logs-export", "method": "GET"}
+        count = self.sample("api_request_duration_seconds_count", **labels)
+        queries = self.sample("api_request_db_queries_sum", view="reward-logs-export")
+
+        response = self.client.get("/api/reward-logs/export/", {"output": "csv"})
+        self.assertEqual(
+            self.sample("api_request_duration_seconds_count", **labels), count
+        )
+        rows = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            self.sample("api_request_duration_seconds_count", **labels), count + 1
+        )
+        self.assertGreater(
+            self.sample("api_request_db_queries_sum", view="reward-logs-export"),
+            queries,
+        )
+
+
+class RewardPipelineMetricsTests(TestCase):
+    def setUp(self):
+        process_rewards.app.conf.task_always_eager = True
+        self.addCleanup(setattr, process_rewards.app.conf, "task_always_eager", False)
+        user = User.objects.create(username="test_user", password="test_password")
+        for minutes in (1, 2, 3):
+            ScheduledReward.objects.create(
+                user=user,
+                amount=10,
+                execute_at=timezone.now() - timedelta(minutes=minutes),
+            )
+
+    @staticmethod
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_process_rewards_metrics(self):
+        """Test that task signals publish backlog, throughput and lag of a run"""
+        task = process_rewards.name
+        processed = self.sample("rewards_processed_total", task=task)
+        runs = self.sample("rewards_run_duration_seconds_count", task=task)
+        lags = self.sample("rewards_execution_lag_seconds_count")
+        slow_lags = self.sample("rewards_execution_lag_seconds_bucket", le="60.0")
+        chunks = self.sample("rewards_chunk_db_duration_seconds_count")
+
+        self.assertEqual(process_rewards.delay().get(), 3)
+
+        self.assertEqual(self.sample("rewards_backlog"), 3)
+        self.assertEqual(
+            self.sample("rewards_processed_total", task=task), processed + 3
+        )
+        self.assertEqual(
+            self.sample("rewards_run_duration_seconds_count", task=task), runs + 1
+        )
+        self.assertGreater(self.sample("rewards_throughput_per_second", task=task), 0)
+        self.assertEqual(self.sample("rewards_execution_lag_seconds_count"), lags + 3)
+        # All rewards were executed more than a minute late
+        self.assertEqual(
+            self.sample("rewards_execution_lag_seconds_bucket", le="60.0"), slow_lags
+        )
+        self.assertGreater(
+            self.sample("rewards_chunk_db_duration_seconds_count"), chunks
+        )
+
+
+@override_settings(ROOT_URLCONF="tests.async_urls")
+class AsyncMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="test_user", password="test_password")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"Authorization": f"Bearer {token}"}
+        self.client = AsyncClient()
+
+    @staticmethod
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_middleware_stays_async(self):
+        """Test that the middleware does not put async views on a sync thread"""
+
+        async def view(request):
+            return HttpResponse()
+
+        for middleware in (MetricsMiddleware, ReplicaMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(view)))
+            self.assertFalse(iscoroutinefunction(middleware(lambda request: None)))
+
+    async def test_async_view_metrics(self):
+        """Test that requests of async views are measured with their queries"""
+        await ScheduledReward.objects.acreate(
+            user=self.user, amount=100, execute_at=timezone.now() + timedelta(days=1)
+        )
+        count = self.sample(
+            "api_request_duration_seconds_count", view="rewards-list", method="GET"
+        )
+        queries = self.sample("api_request_db_queries_sum", view="rewards-list")
+
+        response = await self.client.get("/api/rewards/", headers=self.auth)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(len(response.json()["results"]), 1)
+        self.assertEqual(
+            self.sample(
+                "api_request_duration_seconds_count", view="rewards-list", method="GET"
+            ),
+            count + 1,
+        )
+        self.assertGreater(
+            self.sample("api_request_db_queries_sum", view="rewards-list"), queries
+        )
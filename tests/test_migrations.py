@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from api.models import ScheduledReward
+
+
+class BackfillRequestDateMigrationTest(TransactionTestCase):
+    migrate_from = [("api", "0002_reward_indexes")]
+    migrate_to = [("api", "0003_reward_request_date")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        old_apps = executor.loader.project_state(self.migrate_from).apps
+        user = old_apps.get_model("api", "User").objects.create(username="test_user")
+        rewards = old_apps.get_model("api", "ScheduledReward").objects
+        now = timezone.now()
+        for days in (0, 0, 1):
+            reward = rewards.create(user=user, amount=10, execute_at=now)
+            rewards.filter(pk=reward.pk).update(created_at=now - timedelta(days=days))
+        self.today, self.yesterday = now.date(), (now - timedelta(days=1)).date()
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+
+    def tearDown(self):
+        call_command("migrate", verbosity=0)
+
+    def test_backfill_keeps_first_request_per_day(self):
+        """Test that only the first request of a day gets a request date"""
+        self.assertEqual(
+            list(
+                ScheduledReward.objects.order_by("pk").values_list(
+                    "request_date", flat=True
+                )
+            ),
+            [self.today, None, self.yesterday],
+        )
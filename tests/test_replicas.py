@@ -0,0 +1,132 @@
+import time
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import patch
+
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import replicas
+from api.models import RewardLog, ScheduledReward
+from api.replicas import ReplicaRouter
+from api.tasks import process_rewards
+
+User = get_user_model()
+
+
+@patch("api.replicas.replica_configured", return_value=True)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_primary_by_default(self, _):
+        """Test that reads outside of safe requests go to the primary"""
+        self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_replica_reads(self, _):
+        """Test that enabled replica reads go to the replica until the context ends"""
+        with replicas.replica_reads():
+            self.assertEqual(self.router.db_for_read(User), "replica")
+        self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_write_pins_to_primary(self, _):
+        """Test that reads after a write in the same context go to the primary"""
+        with replicas.replica_reads():
+            self.assertEqual(self.router.db_for_write(User), "default")
+            self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_recent_user_version_pins_to_primary(self, _):
+        """Test that a user cache version bumped by a recent write pins reads"""
+        with replicas.replica_reads():
+            replicas.pin_if_recent(time.time_ns() - 60 * 10**9)
+            self.assertEqual(self.router.db_for_read(User), "replica")
+            replicas.pin_if_recent(time.time_ns())
+            self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_without_replica(self, configured):
+        """Test that reads go to the primary when no replica is configured"""
+        configured.return_value = False
+        with replicas.replica_reads():
+            self.assertEqual(self.router.db_for_read(User), "default")
+
+
+@skipUnless(
+    replicas.REPLICA_DATABASE in settings.DATABASES,
+    "needs a replica database, e.g. api_case.settings_sqlite_replica",
+)
+class ReplicaRoutingTests(TestCase):
+    """The test replica is a separate database, rows exist where they were written"""
+
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="test_user")
+        User.objects.using("replica").create(pk=self.user.pk, username="test_user")
+        ScheduledReward.objects.create(
+            user=self.user, amount=100, execute_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_get_reads_from_replica(self):
+        """Test that a GET is served from the replica"""
+        response = self.client.get("/api/rewards/")
+        self.assertEqual(response.json()["results"], [])
+
+    def test_write_pins_client_to_primary(self):
+        """Test that a client reads its writes from the primary after a POST"""
+        response = self.client.post("/api/rewards/request/", {"amount": 10})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+        response = self.client.get("/api/rewards/")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_streamed_export_reads_from_replica(self):
+        """Test that the export queries run while streaming use the replica"""
+        RewardLog.objects.create(user=self.user, amount=10, reason="test")
+
+        response = self.client.get("/api/reward-logs/export/", {"output": "csv"})
+        rows = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(rows), 1)  # the header only
+
+    def test_pinned_export_reads_from_primary(self):
+        """Test that a client pinned by a write streams the export from the primary"""
+        RewardLog.objects.create(user=self.user, amount=10, reason="test")
+        self.client.cookies[replicas.PIN_COOKIE] = "1"
+
+        response = self.client.get("/api/reward-logs/export/", {"output": "csv"})
+        rows = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(rows), 2)
+
+    @override_settings(ROOT_URLCONF="tests.async_urls", REPLICA_STICKY_SECONDS=0)
+    async def test_async_get_reads_from_replica(self):
+        """Test that the replica routing reaches the ORM threads of async views"""
+        token = RefreshToken.for_user(self.user).access_token
+        response = await AsyncClient().get(
+            "/api/rewards/", headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["results"], [])
+
+    @override_settings(REPLICA_STICKY_SECONDS=60)
+    def test_recent_jwt_user_reads_from_primary(self):
+        """Test that a JWT user whose data changed recently reads from the primary"""
+        client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = client.get("/api/rewards/")
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_processor_uses_primary(self):
+        """Test that the reward processor reads due rewards from the primary"""
+        self.assertEqual(process_rewards(), 1)
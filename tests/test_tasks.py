@@ -1,7 +1,29 @@
+import math
 import os
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import Mock, patch
 
+import fakeredis
+import redis
 from celery import Celery
 from celery.schedules import crontab
+from parameterized import parameterized
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
+from rest_framework.test import APIClient
+
+from api import leases, next_due, processing
+from api.autoscale import BacklogAutoscaler, queue_depth
+from api.beat import RewardsEntry
+from api.models import RewardLog, ScheduledReward
+from api.tasks import execute_reward, process_reward_partition, process_rewards
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_case.settings")
 
@@ -16,3 +38,395 @@ app.conf.beat_schedule = {
         "schedule": crontab(minute="*/5"),  # Run every 5 minutes
     },
 }
+
+User = get_user_model()
+
+
+class ProcessRewardsTaskTest(TestCase):
+    def setUp(self):
+        process_rewards.app.conf.task_always_eager = True
+        self.addCleanup(setattr, process_rewards.app.conf, "task_always_eager", False)
+        self.users = [
+            User.objects.create(username=f"test_user_{i}", password="test_password")
+            for i in range(5)
+        ]
+        for user in self.users:
+            ScheduledReward.objects.create(
+                user=user, amount=10, execute_at=timezone.now() - timedelta(minutes=1)
+            )
+
+    def test_partition_processes_only_its_users(self):
+        """Test that a partition task executes rewards of its own users only"""
+        process_reward_partition.delay(1, 3)
+
+        executed = set(
+            ScheduledReward.objects.filter(is_executed=True).values_list(
+                "user_id", flat=True
+            )
+        )
+        self.assertEqual(executed, {user.id for user in self.users if user.id % 3 == 1})
+
+    @override_settings(REWARDS_PARTITIONS=3)
+    def test_fan_out_pays_every_reward_once(self):
+        """Test that the coordinator covers all partitions without double pay"""
+        process_rewards.delay()
+        process_rewards.delay()
+
+        self.assertFalse(ScheduledReward.objects.filter(is_executed=False).exists())
+        self.assertEqual(RewardLog.objects.count(), len(self.users))
+        self.assertEqual(
+            list(User.objects.values_list("coins", flat=True).distinct()), [10]
+        )
+
+    def test_invalid_partition(self):
+        """Test that the command rejects partitions out of range"""
+        with self.assertRaises(CommandError):
+            call_command("process_rewards", partition="3/3")
+
+
+class ExecuteRewardTaskTest(TestCase):
+    def setUp(self):
+        execute_reward.app.conf.task_always_eager = True
+        self.addCleanup(setattr, execute_reward.app.conf, "task_always_eager", False)
+        self.user = User.objects.create(username="test_user", password="test_password")
+
+    def test_execute_due_reward(self):
+        """Test that the ETA task executes exactly the given reward"""
+        reward = ScheduledReward.objects.create(
+            user=self.user, amount=10, execute_at=timezone.now() - timedelta(seconds=1)
+        )
+        other = ScheduledReward.objects.create(
+            user=self.user, amount=20, execute_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(execute_reward.delay(reward.id).get(), 1)
+        self.assertEqual(execute_reward.delay(reward.id).get(), 0)
+
+        reward.refresh_from_db()
+        other.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertTrue(reward.is_executed)
+        self.assertFalse(other.is_executed)
+        self.assertEqual(self.user.coins, 10)
+
+    @patch("api.tasks.execute_reward.apply_async")
+    def test_early_delivery_is_rescheduled(self, apply_async):
+        """Test that a task delivered before execution time schedules itself again"""
+        reward = ScheduledReward.objects.create(
+            user=self.user, amount=10, execute_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        self.assertEqual(execute_reward(reward.id), 0)
+        apply_async.assert_called_once_with((reward.id,), eta=reward.execute_at)
+
+    @override_settings(REWARDS_ETA_DISPATCH=True)
+    @patch("api.tasks.execute_reward.apply_async")
+    def test_award_request_schedules_eta_task(self, apply_async):
+        """Test that a requested award is scheduled at its execution time"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/rewards/request/", {"amount": 100})
+
+        self.assertEqual(response.status_code, 201, response.content)
+        award = ScheduledReward.objects.get(user=self.user)
+        apply_async.assert_called_once_with((award.id,), eta=award.execute_at)
+
+
+@override_settings(REWARDS_NEXT_DUE_HINT=True)
+class NextDueHintTest(TestCase):
+    def setUp(self):
+        process_rewards.app.conf.task_always_eager = True
+        self.addCleanup(setattr, process_rewards.app.conf, "task_always_eager", False)
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch("api.next_due.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username="test_user", password="test_password")
+
+    def create_reward(self, execute_at):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ScheduledReward.objects.create(
+                user=self.user, amount=10, execute_at=execute_at
+            )
+
+    def test_new_reward_lowers_hint(self):
+        """Test that a saved reward lowers the hint but never raises it"""
+        now = timezone.now()
+        next_due.refresh()
+        self.assertEqual(next_due.get(), math.inf)
+
+        self.create_reward(now + timedelta(minutes=5))
+        self.create_reward(now + timedelta(minutes=10))
+        self.assertEqual(next_due.get(), (now + timedelta(minutes=5)).timestamp())
+
+        self.create_reward(now + timedelta(minutes=1))
+        self.assertEqual(next_due.get(), (now + timedelta(minutes=1)).timestamp())
+        self.assertGreater(self.redis.ttl(next_due.HINT_KEY), 0)
+
+    def test_unknown_hint_stays_unknown(self):
+        """Test that a new reward alone does not make a missing hint authoritative"""
+        self.create_reward(timezone.now() + timedelta(minutes=5))
+
+        self.assertIsNone(next_due.get())
+
+    def test_processing_refreshes_hint(self):
+        """Test that a processing run moves the hint to the next pending reward"""
+        now = timezone.now()
+        self.create_reward(now - timedelta(minutes=1))
+        later = self.create_reward(now + timedelta(minutes=30))
+
+        process_rewards.delay()
+        self.assertEqual(next_due.get(), later.execute_at.timestamp())
+
+        ScheduledReward.objects.filter(pk=later.pk).update(is_executed=True)
+        call_command("process_rewards", stdout=StringIO())
+        self.assertEqual(next_due.get(), math.inf)
+
+    def test_refresh_keeps_concurrent_note(self):
+        """Test that a refresh computed before a concurrent note is discarded"""
+        now = timezone.now()
+        next_due.refresh()
+        hget = self.redis.hget
+
+        def note_meanwhile(*args):
+            version = hget(*args)
+            next_due.note(now + timedelta(minutes=1))
+            return version
+
+        with patch.object(self.redis, "hget", side_effect=note_meanwhile):
+            self.assertFalse(next_due.refresh())
+        self.assertEqual(next_due.get(), (now + timedelta(minutes=1)).timestamp())
+
+    def test_unavailable_redis(self):
+        """Test that beat falls back to the crontab when Redis is down"""
+        with patch.object(self.redis, "hget", side_effect=redis.ConnectionError):
+            self.assertIsNone(next_due.get())
+
+
+@override_settings(REWARDS_NEXT_DUE_HINT=True)
+class RewardsSchedulerTest(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch("api.next_due.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        task = PeriodicTask.objects.get(name="process_rewards")
+        task.last_run_at = timezone.now() - timedelta(minutes=10)
+        self.entry = RewardsEntry(task, app=app)
+
+    def set_hint(self, at):
+        self.redis.hset(next_due.HINT_KEY, "at", at)
+
+    def test_without_hint_follows_crontab(self):
+        """Test that the every-minute crontab applies while the hint is unknown"""
+        self.assertTrue(self.entry.is_due().is_due)
+
+    def test_nothing_pending_skips_sweep(self):
+        """Test that no sweep is sent while no reward is pending"""
+        self.set_hint(next_due.NOTHING_PENDING)
+
+        state = self.entry.is_due()
+        self.assertFalse(state.is_due)
+        self.assertLessEqual(state.next, 60)
+
+    def test_sleeps_until_next_due(self):
+        """Test that beat waits exactly until the next reward is due"""
+        self.set_hint(time.time() + 20)
+
+        state = self.entry.is_due()
+        self.assertFalse(state.is_due)
+        self.assertAlmostEqual(state.next, 20, delta=1)
+
+    def test_triggers_when_reward_becomes_due(self):
+        """Test that a reward due since the last run triggers a sweep at once"""
+        self.entry.last_run_at = timezone.now()
+        self.assertFalse(self.entry.is_due().is_due)
+
+        self.set_hint(time.time() - 1)
+        self.entry.last_run_at = timezone.now() - timedelta(seconds=2)
+        self.assertTrue(self.entry.is_due().is_due)
+
+    def test_other_tasks_are_unaffected(self):
+        """Test that the hint only gates the rewards sweep"""
+        self.set_hint(next_due.NOTHING_PENDING)
+        task = PeriodicTask.objects.get(name="rotate_reward_tables")
+        task.last_run_at = timezone.now() - timedelta(days=2)
+
+        self.assertTrue(RewardsEntry(task, app=app).is_due().is_due)
+
+
+@override_settings(
+    REWARDS_SINGLE_FLIGHT=True, REWARDS_CHUNK_SIZE=2, REWARDS_RUN_BUDGET=60
+)
+class SingleFlightTaskTest(TestCase):
+    def setUp(self):
+        process_rewards.app.conf.task_always_eager = True
+        self.addCleanup(setattr, process_rewards.app.conf, "task_always_eager", False)
+        self.redis = fakeredis.FakeRedis()
+        for module in ("api.leases", "api.processing"):
+            patcher = patch(f"{module}.get_redis", return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        user = User.objects.create(username="test_user", password="test_password")
+        now = timezone.now()
+        self.rewards = [
+            ScheduledReward.objects.create(
+                user=user, amount=10, execute_at=now - timedelta(minutes=5 - i)
+            )
+            for i in range(5)
+        ]
+
+    def executed_ids(self):
+        return list(
+            ScheduledReward.objects.filter(is_executed=True)
+            .order_by("execute_at")
+            .values_list("pk", flat=True)
+        )
+
+    def test_skips_while_another_run_holds_lease(self):
+        """Test that a sweep returns at once while a previous run is active"""
+        other = leases.Lease(process_rewards.name, 60)
+        self.assertTrue(other.acquire())
+
+        self.assertEqual(process_rewards.delay().get(), 0)
+        self.assertEqual(self.executed_ids(), [])
+
+        other.release()
+        self.assertEqual(process_rewards.delay().get(), 5)
+        self.assertFalse(self.redis.exists(other.key))
+
+    @override_settings(REWARDS_RUN_BUDGET=0)
+    def test_budget_resumes_from_checkpoint(self):
+        """Test that runs stop after the budget and continue where they stopped"""
+        self.assertEqual(process_rewards.delay().get(), 2)
+        self.assertEqual(
+            processing.load_checkpoint(),
+            (self.rewards[1].execute_at, self.rewards[1].pk),
+        )
+
+        self.assertEqual(process_rewards.delay().get(), 2)
+        self.assertEqual(process_rewards.delay().get(), 1)
+        self.assertEqual(self.executed_ids(), [reward.pk for reward in self.rewards])
+
+        self.assertEqual(process_rewards.delay().get(), 0)
+        self.assertIsNone(processing.load_checkpoint())
+
+    def test_completed_run_clears_checkpoint(self):
+        """Test that rewards before a stale checkpoint are executed by the next run"""
+        processing.save_checkpoint(self.rewards[2])
+
+        self.assertEqual(process_rewards.delay().get(), 2)
+        self.assertEqual(self.executed_ids(), [self.rewards[3].pk, self.rewards[4].pk])
+        self.assertIsNone(processing.load_checkpoint())
+
+        self.assertEqual(process_rewards.delay().get(), 3)
+
+    def test_lost_lease_stops_run(self):
+        """Test that a run whose lease expired stops after the current chunk"""
+        with patch.object(leases.Lease, "heartbeat", return_value=False):
+            self.assertEqual(process_rewards.delay().get(), 2)
+
+        self.assertEqual(
+            processing.load_checkpoint(),
+            (self.rewards[1].execute_at, self.rewards[1].pk),
+        )
+
+    def test_lease_of_successor_is_kept(self):
+        """Test that only the holder of a lease renews or releases it"""
+        lease = leases.Lease("test", 60)
+        self.assertTrue(lease.acquire())
+        self.redis.delete(lease.key)
+        successor = leases.Lease("test", 60)
+        self.assertTrue(successor.acquire())
+
+        self.assertFalse(lease.heartbeat())
+        lease.release()
+        self.assertTrue(successor.heartbeat())
+        self.assertEqual(self.redis.get(lease.key).decode(), successor.token)
+
+
+@override_settings(
+    CELERY_BROKER_URL="memory://", CELERY_RESULT_BACKEND="cache+memory://"
+)
+class RewardQueueTest(TransactionTestCase):
+    # The autoscaler closes its database connection after each measurement
+    def setUp(self):
+        # Local harness on the in-memory broker of kombu
+        self.app = Celery("api_case")
+        self.app.config_from_object("django.conf:settings", namespace="CELERY")
+        self.addCleanup(self.purge)
+        self.user = User.objects.create(username="test_user", password="test_password")
+
+    def purge(self):
+        with self.app.connection_for_write() as connection:
+            for queue in ("celery", "rewards"):
+                connection.default_channel.queue_purge(queue)
+
+    def send(self, name: str, count: int = 1):
+        for _ in range(count):
+            self.app.send_task(name, args=(1,))
+
+    def test_reward_tasks_are_routed_to_rewards_queue(self):
+        """Test that reward execution is queued apart from other tasks"""
+        self.send(execute_reward.name)
+        self.send(process_rewards.name)
+        self.send("api.tasks.rotate_reward_tables")
+
+        self.assertEqual(queue_depth(self.app, "rewards"), 2)
+        self.assertEqual(queue_depth(self.app, "celery"), 1)
+        self.assertTrue(execute_reward.acks_late)
+        self.assertTrue(process_rewards.reject_on_worker_lost)
+        self.assertEqual(self.app.conf.worker_prefetch_multiplier, 1)
+
+    @parameterized.expand(
+        [
+            ("single partition", 1, 2),  # 2 tasks and the sweep, 1 running
+            ("partitions", 3, 4),  # 2 tasks and 3 chunks, 1 running
+            ("more partitions than chunks", 8, 4),
+        ]
+    )
+    @override_settings(REWARDS_CHUNK_SIZE=2, REWARDS_AUTOSCALE_INTERVAL=0)
+    def test_autoscaler_follows_backlog(self, name, partitions, grown):
+        """Test that the pool grows with queued tasks and due rewards and shrinks after"""
+        pool = Mock(num_processes=1)
+        autoscaler = BacklogAutoscaler(
+            pool, 8, 1, worker=Mock(app=self.app), keepalive=0.001
+        )
+        for _ in range(5):
+            ScheduledReward.objects.create(
+                user=self.user, amount=10, execute_at=timezone.now()
+            )
+        self.send(execute_reward.name, 2)
+
+        with override_settings(REWARDS_PARTITIONS=partitions):
+            autoscaler.maybe_scale()
+        pool.grow.assert_called_once_with(grown)
+
+        pool.num_processes = grown + 1
+        self.purge()
+        ScheduledReward.objects.update(is_executed=True)
+        time.sleep(0.01)
+        autoscaler.maybe_scale()
+        pool.shrink.assert_called_once_with(grown)
+
+    def test_failed_measurement_is_logged(self):
+        """Test that a database outage is logged and leaves the pool as it is"""
+        pool = Mock(num_processes=1)
+        autoscaler = BacklogAutoscaler(pool, 8, 1, worker=Mock(app=self.app))
+        self.send(execute_reward.name, 3)
+
+        with patch.object(ScheduledReward.objects, "due", side_effect=DatabaseError):
+            with self.assertLogs("api.autoscale", "ERROR"):
+                autoscaler.maybe_scale()
+
+        pool.grow.assert_not_called()
+
+    def test_autoscaler_is_capped(self):
+        """Test that the backlog never grows the pool beyond its maximum"""
+        pool = Mock(num_processes=1)
+        autoscaler = BacklogAutoscaler(pool, 3, 1, worker=Mock(app=self.app))
+        self.send(execute_reward.name, 10)
+
+        autoscaler.maybe_scale()
+        pool.grow.assert_called_once_with(2)
@@ -1,20 +1,50 @@
+import csv
+import gzip
+import hashlib
+import json
+import tempfile
 from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
+import fakeredis
+import redis
+from asgiref.sync import sync_to_async
 from parameterized import parameterized
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from drf_spectacular.generators import SchemaGenerator
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from api.models import ScheduledReward
+from api import idempotency, schema, throttling, user_cache
+from api.async_views import AsyncProfileViewSet, AsyncRewardsViewSet
+from api.authentication import AUTH_USER_KEY
+from api.fast_serializers import get_row_serializer
+from api.models import RewardLog, ScheduledReward
+from api.pagination import RewardsCursorPagination
+from api.renderers import ORJSONRenderer
+from api.serializers import ScheduledRewardSerializer, UserSerializer
 
 User = get_user_model()
 
 
 class ViewSetTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create(
             username="test_user",
@@ -30,7 +60,7 @@ class ViewSetTests(TestCase):
         )
         response = self.client.get("/api/rewards/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        response_data = response.json()
+        response_data = response.json()["results"]
         self.assertEqual(len(response_data), 1)
         self.assertEqual(response_data[0]["amount"], 100)
 
@@ -113,9 +143,40 @@ class ViewSetTests(TestCase):
         )
 
         # Second request should fail
-        response = self.client.post("/api/rewards/request/")
+        response = self.client.post("/api/rewards/request/", {"amount": 50})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Award can be requested once per day", str(response.content))
+        self.assertEqual(ScheduledReward.objects.filter(user=self.user).count(), 1)
+
+    def test_award_request_once_per_day_single_insert(self):
+        """Test that admission costs a single INSERT, without a lookup query"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post("/api/rewards/request/", {"amount": 100})
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.content
+        )
+        queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0].startswith("INSERT"))
+
+    def test_award_request_other_integrity_error(self):
+        """Test that constraint failures other than the daily limit are not a 400"""
+        error = IntegrityError("FOREIGN KEY constraint failed")
+        with patch.object(ScheduledReward.objects, "create", side_effect=error):
+            with self.assertRaises(IntegrityError):
+                ScheduledRewardSerializer(context={"user": self.user}).create_award(
+                    {"amount": 100}
+                )
+
+    def test_award_request_without_amount(self):
+        """Test that award request without amount fails"""
+        response = self.client.post("/api/rewards/request/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("amount", response.json())
 
     @parameterized.expand(
         [
@@ -130,3 +191,728 @@ class ViewSetTests(TestCase):
         response = self.client.post("/api/rewards/request/", {"amount": amount})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Amount must be", str(response.content))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(
+            username="test_user",
+            password="test_password",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.reward = ScheduledReward.objects.create(
+            user=self.user, amount=100, execute_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_cache_hit_needs_no_queries(self):
+        """Test that cached responses are served without database queries"""
+        first = self.client.get("/api/rewards/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/rewards/")
+        self.assertEqual(second.json(), first.json())
+
+    def test_processing_invalidates_cache(self):
+        """Test that executed rewards show up in cached profile and rewards"""
+        self.client.get("/api/profile/")
+        self.client.get("/api/rewards/")
+
+        call_command("process_rewards", "--bulk", stdout=StringIO())
+        self.user.refresh_from_db()
+
+        self.assertEqual(self.client.get("/api/profile/").json()["coins"], 100)
+        self.assertTrue(
+            self.client.get("/api/rewards/").json()["results"][0]["is_executed"]
+        )
+
+    def test_award_request_invalidates_cache(self):
+        """Test that a requested award shows up in the cached rewards list"""
+        self.client.get("/api/rewards/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/rewards/request/", {"amount": 10})
+
+        self.assertEqual(len(self.client.get("/api/rewards/").json()["results"]), 2)
+
+    @parameterized.expand(["amount", "execute_at", "is_executed", "delete"])
+    def test_reward_change_invalidates_etag(self, change):
+        """Test that rewards changed outside of the API renew the list and its ETag"""
+        etag = self.client.get("/api/rewards/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            if change == "delete":
+                self.reward.delete()
+            else:
+                self.reward.amount = 200
+                self.reward.execute_at = timezone.now() + timedelta(days=1)
+                self.reward.is_executed = True
+                self.reward.save(update_fields=[change])
+
+        response = self.client.get("/api/rewards/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_cache_stats(self):
+        """Test that hit and miss counters are exposed to staff only"""
+        self.client.get("/api/rewards/")
+        self.client.get("/api/rewards/")
+        self.assertEqual(
+            self.client.get("/api/cache-stats/").status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get("/api/cache-stats/")
+        self.assertEqual(response.json(), {"hits": 1, "misses": 1})
+
+
+class RewardsPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(
+            username="test_user",
+            password="test_password",
+        )
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        for days in range(5):
+            ScheduledReward.objects.create(
+                user=self.user, amount=days + 1, execute_at=now + timedelta(days=days)
+            )
+
+    def test_cursor_pagination(self):
+        """Test that pages follow each other in execution order"""
+        amounts = []
+        url = "/api/rewards/?page_size=2"
+        while url:
+            response = self.client.get(url).json()
+            amounts += [reward["amount"] for reward in response["results"]]
+            url = response["next"]
+        self.assertEqual(amounts, [1, 2, 3, 4, 5])
+
+    def test_page_size_is_capped(self):
+        """Test that the requested page size is capped"""
+        with patch.object(RewardsCursorPagination, "max_page_size", 3):
+            response = self.client.get("/api/rewards/?page_size=100")
+        self.assertEqual(len(response.json()["results"]), 3)
+
+    def test_not_modified(self):
+        """Test that an unchanged list is answered with 304"""
+        response = self.client.get("/api/rewards/")
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/rewards/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(
+            "/api/rewards/", HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Another page has its own tag
+        response = self.client.get("/api/rewards/?page_size=1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_modified_after_processing(self):
+        """Test that executed rewards change the tag of the list"""
+        etag = self.client.get("/api/rewards/")["ETag"]
+        ScheduledReward.objects.update(execute_at=timezone.now())
+
+        call_command("process_rewards", "--bulk", stdout=StringIO())
+
+        response = self.client.get("/api/rewards/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(
+            username="test_user",
+            password="test_password",
+        )
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_user_is_served_from_cache(self):
+        """Test that repeated requests authenticate without querying the user"""
+        self.assertEqual(self.client.get("/api/profile/").status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/profile/")
+        self.assertEqual(response.json()["username"], "test_user")
+
+    def test_password_is_not_cached(self):
+        """Test that the cached user holds no password hash"""
+        self.client.get("/api/profile/")
+
+        version = user_cache.get_version(self.user.pk)
+        cached = cache.get(AUTH_USER_KEY.format(user_id=self.user.pk, version=version))
+        self.assertEqual(cached["fields"]["username"], "test_user")
+        self.assertNotIn("password", cached["fields"])
+        self.assertNotIn(self.user.password, str(cached))
+
+    def test_changed_password_revokes_cached_user(self):
+        """Test that tokens issued before a password change are rejected"""
+        with patch.object(jwt_settings, "CHECK_REVOKE_TOKEN", True):
+            token = RefreshToken.for_user(self.user).access_token
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            self.assertEqual(self.client.get("/api/profile/").status_code, 200)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get("/api/profile/").status_code, 200)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.set_password("changed")
+                self.user.save()
+            response = self.client.get("/api/profile/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test that deactivating a user invalidates the cached user"""
+        self.client.get("/api/profile/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response = self.client.get("/api/profile/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_version_is_bumped_on_commit(self):
+        """Test that a request before the commit can not cache the old user anew"""
+        self.client.get("/api/profile/")
+        version = user_cache.get_version(self.user.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save()
+            self.assertEqual(user_cache.get_version(self.user.pk), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(user_cache.get_version(self.user.pk), version)
+        response = self.client.get("/api/profile/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_change_is_visible(self):
+        """Test that profile changes invalidate the cached user"""
+        self.client.get("/api/profile/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = "test@example.com"
+            self.user.save()
+
+        response = self.client.get("/api/profile/")
+        self.assertEqual(response.json()["email"], "test@example.com")
+
+    def test_processed_coins_are_visible(self):
+        """Test that coins given by the bulk processor invalidate the cached user"""
+        self.client.get("/api/profile/")
+        ScheduledReward.objects.create(
+            user=self.user, amount=100, execute_at=timezone.now()
+        )
+
+        call_command("process_rewards", "--bulk", stdout=StringIO())
+
+        self.assertEqual(self.client.get("/api/profile/").json()["coins"], 100)
+
+
+class RewardLogExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(
+            username="test_user",
+            password="test_password",
+        )
+        self.other_user = User.objects.create(
+            username="other_user",
+            password="test_password",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.now = timezone.now()
+        for user in (self.user, self.other_user):
+            for days in (3, 2, 1):
+                log = RewardLog.objects.create(user=user, amount=days, reason="test")
+                RewardLog.objects.filter(pk=log.pk).update(
+                    given_at=self.now - timedelta(days=days)
+                )
+
+    def export(self, **params):
+        response = self.client.get("/api/reward-logs/export/", params)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_export_csv(self):
+        """Test that users export their own logs as CSV in time order"""
+        response, content = self.export()
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(
+            rows[0], ["id", "user_id", "username", "amount", "given_at", "reason"]
+        )
+        self.assertEqual([row[3] for row in rows[1:]], ["3", "2", "1"])
+        self.assertEqual({row[2] for row in rows[1:]}, {"test_user"})
+
+    def test_export_ndjson_date_range(self):
+        """Test that logs are filtered by the given_at range"""
+        response, content = self.export(
+            output="ndjson",
+            start=(self.now - timedelta(days=2, hours=1)).isoformat(),
+            end=(self.now - timedelta(hours=12)).isoformat(),
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["amount"] for row in rows], [2, 1])
+
+    @parameterized.expand([("text/csv",), ("application/x-ndjson",)])
+    def test_export_format_from_accept_header(self, content_type):
+        """Test that the export format is negotiated by the Accept header"""
+        response = self.client.get(
+            "/api/reward-logs/export/", headers={"Accept": content_type}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], content_type)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 3 + (content_type == "text/csv"))
+
+    def test_export_all_users_staff_only(self):
+        """Test that only staff export logs of all users"""
+        response = self.client.get(
+            "/api/reward-logs/export/", {"scope": "all"}, headers={"Accept": "text/csv"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("Only staff", response.json()["detail"])
+
+        self.user.is_staff = True
+        self.user.save()
+        _, content = self.export(scope="all", output="ndjson")
+        self.assertEqual(len(content.splitlines()), 6)
+
+
+class AsyncViewSetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create(username="test_user", password="test_password")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"Authorization": f"Bearer {token}"}
+
+    async def call(self, viewset, actions, request):
+        response = await viewset.as_view(actions)(request)
+        return response.render() if hasattr(response, "render") else response
+
+    async def test_profile_view(self):
+        """Test that the async profile matches the sync one"""
+        request = self.factory.get("/api/profile/", headers=self.auth)
+        response = await self.call(AsyncProfileViewSet, {"get": "list"}, request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(response.content),
+            {"username": "test_user", "email": "", "coins": 0},
+        )
+
+    async def test_rewards_list_matches_sync(self):
+        """Test that the async rewards list returns the sync payload and ETag"""
+        await ScheduledReward.objects.acreate(
+            user=self.user, amount=100, execute_at=timezone.now() + timedelta(days=1)
+        )
+        async_response = await self.call(
+            AsyncRewardsViewSet,
+            {"get": "list"},
+            self.factory.get("/api/rewards/", headers=self.auth),
+        )
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        sync_response = await sync_to_async(client.get)("/api/rewards/")
+
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response["ETag"], sync_response["ETag"])
+
+        request = self.factory.get(
+            "/api/rewards/",
+            headers={**self.auth, "If-None-Match": async_response["ETag"]},
+        )
+        response = await self.call(AsyncRewardsViewSet, {"get": "list"}, request)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_award_request_once_per_day(self):
+        """Test that the async award request admits one request per day"""
+        for amount, expected in ((100, 201), (50, 400)):
+            request = self.factory.post(
+                "/api/rewards/request/",
+                {"amount": amount},
+                content_type="application/json",
+                headers=self.auth,
+            )
+            response = await self.call(
+                AsyncRewardsViewSet, {"post": "award_request"}, request
+            )
+            self.assertEqual(response.status_code, expected, response.content)
+
+        self.assertIn("Award can be requested once per day", str(response.content))
+        award = await ScheduledReward.objects.aget(user=self.user)
+        self.assertEqual(award.amount, 100)
+
+
+class FastPathSerializationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="test_user ünïcode", email="test@example.com", coins=7
+        )
+        now = timezone.now()
+        ScheduledReward.objects.bulk_create(
+            ScheduledReward(
+                user=self.user,
+                amount=amount,
+                execute_at=now + timedelta(days=amount, microseconds=amount),
+                is_executed=amount % 2 == 0,
+            )
+            for amount in range(1, 6)
+        )
+
+    def test_rewards_match_model_serializer(self):
+        """Test that the fast path renders rewards to the same bytes"""
+        rewards = ScheduledReward.objects.filter(user=self.user).order_by("pk")
+        row_serializer = get_row_serializer(ScheduledRewardSerializer)
+
+        expected = JSONRenderer().render(
+            ScheduledRewardSerializer(rewards, many=True).data
+        )
+        rendered = ORJSONRenderer().render(
+            row_serializer.to_representation_many(
+                rewards.values(*row_serializer.sources)
+            )
+        )
+        self.assertEqual(rendered, expected)
+
+    def test_profile_matches_model_serializer(self):
+        """Test that the fast path renders the profile to the same bytes"""
+        expected = JSONRenderer().render(UserSerializer(self.user).data)
+        rendered = ORJSONRenderer().render(
+            get_row_serializer(UserSerializer).from_instance(self.user)
+        )
+        self.assertEqual(rendered, expected)
+
+    def test_renderer_matches_json_renderer(self):
+        """Test that values formatted by the DRF encoder render to the same bytes"""
+        data = {
+            "datetime": timezone.now(),
+            "decimal": Decimal("1.10"),
+            "lazy": gettext_lazy("Not found."),
+            "separators": "\u2028\u2029",
+            "nested": [{"id": 1, "none": None, "flag": True}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(username="test_user", password="test_password")
+        self.client.force_authenticate(user=self.user)
+
+    def post(self, data, key="retry-1"):
+        return self.client.post(
+            "/api/rewards/request/", data, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_first_response(self):
+        """Test that a retry gets the first response without touching the database"""
+        response = self.post({"amount": 100})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(0):
+            retry = self.post({"amount": 100})
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.content, response.content)
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], "true")
+        self.assertEqual(ScheduledReward.objects.count(), 1)
+
+    def test_validation_error_is_replayed(self):
+        """Test that a rejected request is replayed with its errors"""
+        response = self.post({"amount": 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        retry = self.post({"amount": 0})
+        self.assertEqual(retry.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.json(), response.json())
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], "true")
+
+    def test_new_key_runs_the_view(self):
+        """Test that a new key is a new request, rejected once per day"""
+        self.post({"amount": 100})
+        response = self.post({"amount": 100}, key="retry-2")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, response)
+
+    def test_key_reused_for_different_request(self):
+        """Test that a key can not be reused with a different body"""
+        self.post({"amount": 100})
+        response = self.post({"amount": 50})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0)
+    def test_duplicate_in_progress(self):
+        """Test that a duplicate of a running request does not reach the database"""
+        key = hashlib.sha256(b"retry-1").hexdigest()
+        cache.add(idempotency.LOCK_KEY.format(user_id=self.user.pk, key=key), 1)
+
+        response = self.post({"amount": 100})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(ScheduledReward.objects.exists())
+
+    async def test_async_retry_replays_first_response(self):
+        """Test that the async award request replays retries as well"""
+        token = RefreshToken.for_user(self.user).access_token
+        headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "retry-1"}
+        responses = []
+        for _ in range(2):
+            request = AsyncRequestFactory().post(
+                "/api/rewards/request/",
+                {"amount": 100},
+                content_type="application/json",
+                headers=headers,
+            )
+            view = AsyncRewardsViewSet.as_view({"post": "award_request"})
+            responses.append((await view(request)).render())
+
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(responses[1].content, responses[0].content)
+        self.assertEqual(await ScheduledReward.objects.acount(), 1)
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"award_request": "2/min", "token_obtain": "2/min"},
+    }
+)
+class TokenBucketThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch("api.throttling.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = APIClient()
+        self.user = User.objects.create(username="test_user", password="test_password")
+
+    def test_award_request_is_throttled(self):
+        """Test that award requests beyond the bucket are rejected with Retry-After"""
+        self.client.force_authenticate(user=self.user)
+        statuses = [
+            self.client.post("/api/rewards/request/", {"amount": 10}).status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [201, 400, 429])
+
+        response = self.client.post("/api/rewards/request/", {"amount": 10})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertLessEqual(int(response["Retry-After"]), 30)
+
+    def test_token_obtain_is_throttled_before_password_check(self):
+        """Test that throttled token requests do not reach the database"""
+        credentials = {"username": "test_user", "password": "wrong"}
+        for _ in range(2):
+            response = self.client.post("/api/token/", credentials)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with self.assertNumQueries(0):
+            response = self.client.post("/api/token/", credentials)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_does_not_evade_throttle(self):
+        """Test that rotating X-Forwarded-For keeps the bucket of the peer address"""
+        statuses = [
+            self.client.post(
+                "/api/token/", {}, headers={"X-Forwarded-For": f"10.0.0.{index}"}
+            ).status_code
+            for index in range(3)
+        ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    @override_settings(
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"token_obtain": "2/min"},
+            "NUM_PROXIES": 1,
+        }
+    )
+    def test_trusted_proxy_hop_identifies_client(self):
+        """Test that behind a trusted proxy the hop it appended is the address"""
+        for client_address in ("10.0.0.1", "10.0.0.2"):
+            for _ in range(2):
+                response = self.client.post(
+                    "/api/token/",
+                    {},
+                    headers={"X-Forwarded-For": f"1.2.3.4, {client_address}"},
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bucket_refills(self):
+        """Test that tokens come back with the time passed"""
+        for _ in range(3):
+            self.client.post("/api/token/", {})
+        key = throttling.BUCKET_KEY.format(scope="token_obtain", ident="ip:127.0.0.1")
+        ts = float(self.redis.hget(key, "ts"))
+        self.redis.hset(key, "ts", ts - 30)
+
+        response = self.client.post("/api/token/", {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_redis_failure_does_not_block(self):
+        """Test that requests are served when Redis is unavailable"""
+        with patch.object(self.redis, "eval", side_effect=redis.ConnectionError):
+            for _ in range(3):
+                response = self.client.post("/api/token/", {})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CachedSchemaViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        call_command("build_schema", output_dir=self.root, stdout=StringIO())
+        override = override_settings(SCHEMA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        schema.read.cache_clear()
+        self.addCleanup(schema.read.cache_clear)
+
+    @parameterized.expand(
+        [
+            ("yaml", {}, "application/vnd.oai.openapi"),
+            ("json", {"format": "json"}, "application/vnd.oai.openapi+json"),
+        ]
+    )
+    def test_serves_pregenerated_schema(self, format, params, content_type):
+        """Test that the schema is read from the built file without introspection"""
+        with patch.object(SchemaGenerator, "get_schema") as get_schema:
+            response = self.client.get("/api/schema/", params)
+
+        get_schema.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.content, (self.root / f"schema.{format}").read_bytes()
+        )
+        self.assertTrue(response["Content-Type"].startswith(content_type))
+        self.assertEqual(response["Cache-Control"], "public, max-age=86400")
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_not_modified(self):
+        """Test that a cached schema is revalidated by its strong ETag"""
+        etag = self.client.get("/api/schema/")["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        response = self.client.get("/api/schema/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_gzip_variant(self):
+        """Test that clients accepting gzip get the precompressed file"""
+        plain = self.client.get("/api/schema/")
+        response = self.client.get(
+            "/api/schema/", headers={"Accept-Encoding": "gzip, deflate"}
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response["ETag"], plain["ETag"])
+
+    @parameterized.expand(
+        [
+            ("refused", "gzip;q=0, deflate"),
+            ("refused spaced", "deflate, gzip ; q = 0.0"),
+            ("other coding", "x-gzip-like"),
+        ]
+    )
+    def test_gzip_refused(self, name, accept_encoding):
+        """Test that the plain file is served unless gzip has a nonzero quality"""
+        plain = self.client.get("/api/schema/")
+        response = self.client.get(
+            "/api/schema/", headers={"Accept-Encoding": accept_encoding}
+        )
+
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(response.content, plain.content)
+
+    def test_schema_built_after_miss(self):
+        """Test that files built after a request without them are served"""
+        for path in self.root.iterdir():
+            path.unlink()
+        self.assertTrue(self.client.get("/api/schema/").content.startswith(b"openapi"))
+
+        call_command("build_schema", stdout=StringIO())
+        with patch.object(SchemaGenerator, "get_schema") as get_schema:
+            response = self.client.get("/api/schema/")
+
+        get_schema.assert_not_called()
+        self.assertEqual(response.content, (self.root / "schema.yaml").read_bytes())
+        self.assertIn("Cache-Control", response)
+
+    @parameterized.expand([("debug", True, False), ("not built", False, True)])
+    def test_live_generation_fallback(self, name, debug, remove_files):
+        """Test that the schema is generated per request in DEBUG or without files"""
+        if remove_files:
+            for path in self.root.iterdir():
+                path.unlink()
+
+        with override_settings(DEBUG=debug):
+            response = self.client.get("/api/schema/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b"openapi: 3"))
+        self.assertNotIn("Cache-Control", response)
+
+
+@override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+)
+class UserAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin_password"
+        )
+        self.client.force_login(self.admin)
+
+    def test_coins_are_read_only(self):
+        """Test that staff can not change the coins bypassing the reward logs"""
+        user = User.objects.create(username="test_user", coins=10)
+
+        change_page = self.client.get(f"/admin/api/user/{user.pk}/change/")
+        add_page = self.client.get("/admin/api/user/add/")
+
+        self.assertEqual(change_page.status_code, 200)
+        self.assertNotIn("coins", change_page.context["adminform"].form.fields)
+        self.assertContains(change_page, "10")
+        self.assertEqual(add_page.status_code, 200)
+        self.assertNotIn("coins", add_page.context["adminform"].form.fields)
+
+    def test_reward_logs_are_read_only(self):
+        """Test that staff can view reward logs but not add, change or delete them"""
+        log = RewardLog.objects.create(user=self.admin, amount=10, reason="test")
+        url = f"/admin/api/rewardlog/{log.pk}"
+
+        self.assertEqual(self.client.get("/admin/api/rewardlog/").status_code, 200)
+        self.assertEqual(self.client.get("/admin/api/rewardlog/add/").status_code, 403)
+        self.assertEqual(self.client.get(f"{url}/delete/").status_code, 403)
+        response = self.client.post(f"{url}/change/", {"amount": 1000})
+        self.assertEqual(response.status_code, 403)
+        log.refresh_from_db()
+        self.assertEqual(log.amount, 10)